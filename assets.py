@@ -0,0 +1,41 @@
+# ============================================
+# ANXIETY CHAT - ARCHIVOS ESTÁTICOS CON HUELLA
+# ============================================
+
+import hashlib
+import mimetypes
+import os
+from collections import namedtuple
+
+Asset = namedtuple('Asset', 'data mimetype digest')
+
+
+class AssetManifest:
+    """Archivos de una carpeta cargados en memoria al iniciar, cada uno con una
+    huella del contenido en el nombre: 'chat.js' → 'chat.3f9a1c2b4d5e.js'.
+
+    Como la URL cambia cuando cambia el archivo, el navegador puede guardarlo
+    sin volver a preguntar (Cache-Control immutable) y la huella sirve de ETag.
+    """
+
+    def __init__(self, folder, prefix='/static/'):
+        self.files = {}  # nombre con huella → Asset
+        self.urls = {}   # nombre original → URL
+        for name in sorted(os.listdir(folder)):
+            path = os.path.join(folder, name)
+            if not os.path.isfile(path):
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            stem, ext = os.path.splitext(name)
+            fingerprinted = f'{stem}.{digest}{ext}'
+            mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            self.files[fingerprinted] = Asset(data, mimetype, digest)
+            self.urls[name] = prefix + fingerprinted
+
+    def url(self, name):
+        return self.urls[name]
+
+    def get(self, fingerprinted):
+        return self.files.get(fingerprinted)
@@ -0,0 +1,391 @@
+# ============================================
+# ANXIETY CHAT - SERVIDOR ASYNCIO
+# ============================================
+# Alternativa a la app WSGI para muchas conexiones mayormente inactivas:
+#
+#   python async_server.py --port 8000 [--threads 16] [--reuse-port]
+#
+# Un solo hilo atiende todas las conexiones (HTTP/1.1 con keep-alive) y solo
+# el trabajo que bloquea pasa a otros hilos: el almacenamiento a un grupo
+# acotado con asyncio.to_thread y el hash pbkdf2 al grupo de HASHER. Sirve las mismas rutas y plantillas
+# que app.py y acepta la misma cookie de sesión firmada, así que ambas
+# entradas pueden convivir detrás del mismo balanceador. Con --reuse-port
+# varios procesos comparten el puerto (cada uno con su propio store, igual
+# que los workers de gunicorn).
+
+import argparse
+import asyncio
+import io
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+
+from itsdangerous import BadSignature
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import http_date
+from werkzeug.utils import redirect
+from werkzeug.wrappers import Request, Response
+
+import app as web
+from hashing import Overloaded
+from streaming import HEARTBEAT, QUEUE_SIZE, format_event
+
+logger = logging.getLogger(__name__)
+
+# Límites de una petición: cabeceras, cuerpo y espera entre peticiones
+MAX_HEADER_SIZE = 64 * 1024
+MAX_BODY_SIZE = 1024 * 1024
+KEEPALIVE_TIMEOUT = 75
+
+SESSION_COOKIE = web.app.config['SESSION_COOKIE_NAME']
+SESSION_MAX_AGE = int(web.app.permanent_session_lifetime.total_seconds())
+SERIALIZER = web.app.session_interface.get_signing_serializer(web.app)
+
+
+class EventStream(Response):
+    """Respuesta de /api/stream: handle_connection escribe los eventos a medida que llegan."""
+
+    def __init__(self, username):
+        super().__init__(mimetype='text/event-stream',
+                         headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        self.username = username
+
+
+class BadRequest(Exception):
+    def __init__(self, status, reason):
+        super().__init__(reason)
+        self.status = status
+
+
+# ============================================
+# SESIÓN (MISMA COOKIE QUE FLASK)
+# ============================================
+
+def load_session(req):
+    cookie = req.cookies.get(SESSION_COOKIE)
+    if not cookie:
+        return {}
+    try:
+        return SERIALIZER.loads(cookie, max_age=SESSION_MAX_AGE)
+    except BadSignature:
+        return {}
+
+def save_session(response, data):
+    config = web.app.config
+    if not data:
+        response.delete_cookie(SESSION_COOKIE, path=config['SESSION_COOKIE_PATH'] or '/')
+        return
+    response.set_cookie(
+        SESSION_COOKIE, SERIALIZER.dumps(dict(data)),
+        path=config['SESSION_COOKIE_PATH'] or '/',
+        domain=config['SESSION_COOKIE_DOMAIN'],
+        secure=config['SESSION_COOKIE_SECURE'],
+        httponly=config['SESSION_COOKIE_HTTPONLY'],
+        samesite=config['SESSION_COOKIE_SAMESITE'],
+    )
+
+
+# ============================================
+# RUTAS
+# ============================================
+
+# Las funciones handle_* de app.py que tocan el store van a un hilo; las demás
+# responden desde memoria y corren en el event loop
+
+async def index(req, session, adapter):
+    if 'user_id' in session:
+        return redirect(adapter.build('chat'))
+    return web.app.response_class(web.LOGIN_PAGE, mimetype='text/html')
+
+# El hash pbkdf2 se espera con wrap_future: un inicio de sesión en la cola de
+# HASHER no ocupa ninguno de los --threads hilos que atienden al resto
+
+async def register(req, session, adapter):
+    error, fields = await asyncio.to_thread(web.register_request, req)
+    if error is not None:
+        return error
+    username, password = fields
+    try:
+        with web.phase('password_hash'):
+            password_hash = await asyncio.wrap_future(web.HASHER.generate_future(password))
+    except Overloaded as e:
+        return web.server_busy(e)
+    return await asyncio.to_thread(web.finish_register, username, password_hash)
+
+async def login(req, session, adapter):
+    error, fields = await asyncio.to_thread(web.login_request, req)
+    if error is not None:
+        return error
+    username, pwhash, password = fields
+    try:
+        with web.phase('password_hash'):
+            valid = await asyncio.wrap_future(web.HASHER.check_future(pwhash, password))
+    except Overloaded as e:
+        return web.server_busy(e)
+    response, username = web.finish_login(username, valid)
+    if username is not None:
+        session['user_id'] = username
+        save_session(response, session)
+    return response
+
+async def logout(req, session, adapter):
+    session.pop('user_id', None)
+    response = redirect(adapter.build('index'))
+    save_session(response, session)
+    return response
+
+async def chat(req, session, adapter):
+    if 'user_id' not in session:
+        return redirect(adapter.build('index'))
+    return web.app.response_class(web.render_chat(session['user_id'], stream_enabled=True), mimetype='text/html')
+
+async def static_asset(req, session, adapter, filename):
+    return web.handle_static(filename, req)
+
+async def analyze(req, session, adapter):
+    return await asyncio.to_thread(web.handle_analyze, session.get('user_id'), req)
+
+async def analyze_batch(req, session, adapter):
+    return await asyncio.to_thread(web.handle_analyze_batch, session.get('user_id'), req)
+
+async def save(req, session, adapter):
+    return await asyncio.to_thread(web.handle_save, session.get('user_id'), req)
+
+async def message(req, session, adapter):
+    return await asyncio.to_thread(web.handle_message, session.get('user_id'), req)
+
+async def stream(req, session, adapter):
+    if 'user_id' not in session:
+        return web.not_authenticated()
+    return EventStream(session['user_id'])
+
+async def history(req, session, adapter):
+    return await asyncio.to_thread(web.handle_history, session.get('user_id'), req)
+
+async def chats(req, session, adapter):
+    return await asyncio.to_thread(web.handle_chats, session.get('user_id'), req)
+
+async def ham_stats(req, session, adapter):
+    return await asyncio.to_thread(web.handle_stats, session.get('user_id'))
+
+async def prometheus_metrics(req, session, adapter):
+    return await asyncio.to_thread(web.handle_metrics)
+
+# Mismos endpoints que app.url_map: el enrutamiento se comparte
+ROUTES = {
+    'index': index,
+    'register': register,
+    'login': login,
+    'logout': logout,
+    'chat': chat,
+    'static_asset': static_asset,
+    'analyze': analyze,
+    'analyze_batch': analyze_batch,
+    'save': save,
+    'message': message,
+    'stream': stream,
+    'history': history,
+    'chats': chats,
+    'ham_stats': ham_stats,
+    'prometheus_metrics': prometheus_metrics,
+}
+
+async def dispatch(req):
+    adapter = web.app.url_map.bind_to_environ(req.environ)
+    rule = None
+    try:
+        rule, values = adapter.match(return_rule=True)
+        session = load_session(req)
+        response = await ROUTES[rule.endpoint](req, session, adapter, **values)
+    except HTTPException as e:
+        response = e.get_response(req.environ)
+    except Exception:
+        logger.exception('Error en %s %s', req.method, req.path)
+        response = web.json_response({'error': 'Error interno'}, 500)
+    return rule, web.add_common_headers(response, req.accept_encodings)
+
+
+# ============================================
+# HTTP/1.1
+# ============================================
+
+async def read_request(reader, peer):
+    """Lee una petición y arma el environ WSGI; None si el cliente cerró."""
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError as e:
+        if e.partial.strip():
+            raise BadRequest(400, 'Petición incompleta')
+        return None
+    except asyncio.LimitOverrunError:
+        raise BadRequest(431, 'Cabeceras demasiado grandes')
+
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, target, protocol = lines[0].split(' ')
+    except ValueError:
+        raise BadRequest(400, 'Línea de petición inválida')
+    path, _, query = target.partition('?')
+
+    environ = {
+        'REQUEST_METHOD': method,
+        'SCRIPT_NAME': '',
+        'PATH_INFO': unquote(path, 'latin-1'),
+        'QUERY_STRING': query,
+        'SERVER_PROTOCOL': protocol,
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'REMOTE_ADDR': peer[0] if peer else '',
+        'wsgi.url_scheme': 'http',
+        'wsgi.version': (1, 0),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, _, value = line.partition(':')
+        key = name.strip().upper().replace('-', '_')
+        if key in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[key] = value.strip()
+        else:
+            key = 'HTTP_' + key
+            value = value.strip()
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    if 'HTTP_HOST' in environ:
+        host, _, port = environ['HTTP_HOST'].partition(':')
+        environ['SERVER_NAME'], environ['SERVER_PORT'] = host, port or '80'
+
+    if 'chunked' in environ.get('HTTP_TRANSFER_ENCODING', '').lower():
+        raise BadRequest(411, 'Se requiere Content-Length')
+    try:
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        raise BadRequest(400, 'Content-Length inválido')
+    if length > MAX_BODY_SIZE:
+        raise BadRequest(413, 'Cuerpo demasiado grande')
+    body = await reader.readexactly(length) if length else b''
+    environ['wsgi.input'] = io.BytesIO(body)
+    return environ
+
+def keep_alive(environ):
+    connection = environ.get('HTTP_CONNECTION', '').lower()
+    if environ['SERVER_PROTOCOL'] == 'HTTP/1.0':
+        return connection == 'keep-alive'
+    return connection != 'close'
+
+def serialize(response, environ, persistent):
+    headers = response.get_wsgi_headers(environ)
+    body = b''.join(response.get_app_iter(environ))
+    if 'Content-Length' not in headers and response.status_code not in (204, 304):
+        headers['Content-Length'] = str(len(body))
+    headers['Date'] = http_date()
+    headers['Connection'] = 'keep-alive' if persistent else 'close'
+    head = [f'HTTP/1.1 {response.status}']
+    head.extend(f'{name}: {value}' for name, value in headers.to_wsgi_list())
+    return ('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body
+
+async def send_events(writer, response, environ):
+    """Mantiene abierta la conexión de /api/stream hasta que el cliente se va."""
+    headers = response.get_wsgi_headers(environ)
+    headers.pop('Content-Length', None)
+    headers['Date'] = http_date()
+    headers['Connection'] = 'close'
+    head = [f'HTTP/1.1 {response.status}']
+    head.extend(f'{name}: {value}' for name, value in headers.to_wsgi_list())
+    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue(QUEUE_SIZE)
+
+    def put(item):
+        if events.full():
+            logger.warning('Evento %s descartado para %s (cola llena)', item[0], response.username)
+        else:
+            events.put_nowait(item)
+
+    def send(item):
+        # publish() se llama desde los hilos de asyncio.to_thread
+        loop.call_soon_threadsafe(put, item)
+
+    web.STREAMS.subscribe(response.username, send)
+    try:
+        writer.write(b'retry: 3000\n\n')
+        await writer.drain()
+        while True:
+            try:
+                event, data = await asyncio.wait_for(events.get(), HEARTBEAT)
+            except asyncio.TimeoutError:
+                writer.write(b': ping\n\n')
+            else:
+                writer.write(format_event(event, data).encode('utf-8'))
+            await writer.drain()
+    finally:
+        web.STREAMS.unsubscribe(response.username, send)
+
+async def handle_connection(reader, writer):
+    peer = writer.get_extra_info('peername')
+    try:
+        while True:
+            try:
+                environ = await asyncio.wait_for(read_request(reader, peer), KEEPALIVE_TIMEOUT)
+            except BadRequest as e:
+                writer.write(f'HTTP/1.1 {e.status} {e}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n'
+                             .encode('latin-1'))
+                break
+            except asyncio.TimeoutError:
+                break
+            if environ is None:
+                break
+
+            start = time.perf_counter()
+            req = Request(environ)
+            rule, response = await dispatch(req)
+            if isinstance(response, EventStream):
+                await send_events(writer, response, environ)
+                break
+            persistent = keep_alive(environ)
+            writer.write(serialize(response, environ, persistent))
+            await writer.drain()
+            if web.METRICS is not None:
+                web.METRICS.observe_request(rule.rule if rule else 'sin_ruta', req.method,
+                                            response.status_code, time.perf_counter() - start)
+            if not persistent:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host, port, threads, reuse_port):
+    # asyncio.to_thread usa el executor por defecto: se acota aquí
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=threads, thread_name_prefix='anxiety-io'))
+    server = await asyncio.start_server(handle_connection, host, port, limit=MAX_HEADER_SIZE,
+                                        reuse_port=reuse_port or None, backlog=1024)
+    print(f"🌐 Servidor asyncio en http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Anxiety Chat con asyncio')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--threads', type=int, default=16,
+                        help='Hilos para el almacenamiento y el hash de contraseñas')
+    parser.add_argument('--reuse-port', action='store_true',
+                        help='Permite varios procesos escuchando el mismo puerto (Linux)')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.threads, args.reuse_port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+# ============================================
+# BENCHMARK - CACHÉ DE analyze_message
+# ============================================
+# Uso: python benchmarks/bench_cache.py [sessions.json] [repeticiones]
+# Repite los mensajes reales de sessions.json y mide aciertos y tiempo ahorrado.
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+from matcher import tokenize
+from storage import load_json
+
+
+def load_messages(filename):
+    # load_json detecta el formato (JSON o msgpack, según ANXIETY_CODEC)
+    sessions = load_json(filename)
+    return [entry['message'] for entries in sessions.values() for entry in entries]
+
+
+def replay(messages, analyze):
+    start = time.perf_counter()
+    for message in messages:
+        analyze(message)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    filename = sys.argv[1] if len(sys.argv) > 1 else 'sessions.json'
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    messages = load_messages(filename)
+    # Orden aleatorio pero reproducible, como llegarían de muchos estudiantes
+    stream = messages * repeat
+    random.Random(7).shuffle(stream)
+
+    uncached = replay(stream, lambda m: app.build_responses(tokenize(m), app.KB.snapshot))
+    cached = replay(stream, app.analyze_message)
+    stats = app.ANALYSIS_CACHE.stats()
+
+    print(f"{len(messages)} mensajes de {filename}, {len(stream)} llamadas")
+    print(f"sin caché: {uncached / len(stream) * 1e6:8.2f} µs/mensaje")
+    print(f"con caché: {cached / len(stream) * 1e6:8.2f} µs/mensaje")
+    print(f"aciertos: {stats['hits']}  fallos: {stats['misses']}  "
+          f"desalojos: {stats['evictions']}  tasa: {stats['hit_rate']:.1%}")
+    print(f"ahorro: {(uncached - cached) * 1e3:.1f} ms en total")
@@ -0,0 +1,73 @@
+# ============================================
+# BENCHMARK - FORMATOS DE LOS ARCHIVOS DE DATOS
+# ============================================
+# Uso: python benchmarks/bench_codecs.py [usuarios] [repeticiones]
+#
+# Arma users.json y sessions.json sintéticos copiando los registros reales del
+# proyecto (mismas claves y tamaños de texto) para `usuarios` estudiantes y
+# mide con cada formato de ANXIETY_CODEC el tiempo de codificar (lo que hace
+# cada flush), el de decodificar con detección automática (lo que hace el
+# arranque) y el tamaño en disco. No escribe archivos.
+
+import copy
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import serialization
+from serialization import CODECS, decode
+from storage import load_json
+
+
+def synthetic_files(count):
+    """(users, sessions) con `count` usuarios hechos a partir de los registros reales."""
+    users_real = load_json(os.path.join(ROOT, 'users.json'))
+    sessions_real = load_json(os.path.join(ROOT, 'sessions.json'))
+    user_templates = list(users_real.values())
+    chat_templates = [entry for entries in sessions_real.values() for entry in entries]
+    start = datetime(2025, 10, 1)
+    users, sessions = {}, {}
+    for n in range(count):
+        name = f'Estudiante {n:06d}'
+        user = copy.deepcopy(user_templates[n % len(user_templates)])
+        users[name] = user
+        chats = []
+        for i in range(n % 25 + 1):
+            entry = dict(chat_templates[(n + i) % len(chat_templates)])
+            entry['timestamp'] = (start + timedelta(minutes=n * 37 + i)).isoformat()
+            chats.append(entry)
+        sessions[name] = chats
+    return users, sessions
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    files = dict(zip(('users.json', 'sessions.json'), synthetic_files(count)))
+
+    print(f"{count} usuarios; orjson: {'sí' if serialization.orjson else 'no'}, "
+          f"msgpack: {'paquete' if serialization.msgpack else 'versión en Python'}\n")
+    print(f"{'archivo':<14} {'formato':<8} {'KiB':>9} {'codificar ms':>13} {'decodificar ms':>15}")
+    for filename, data in files.items():
+        for name, codec in CODECS.items():
+            if name == 'orjson' and serialization.orjson is None:
+                continue
+            encoded = codec.encode(data)
+            encode_ms = timed(lambda: codec.encode(data), repeat)
+            decode_ms = timed(lambda: decode(encoded), repeat)
+            assert decode(encoded) == data
+            print(f"{filename:<14} {name:<8} {len(encoded) / 1024:>9.0f} {encode_ms:>13.1f} {decode_ms:>15.1f}")
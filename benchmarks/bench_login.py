@@ -0,0 +1,114 @@
+# ============================================
+# BENCHMARK - INICIOS DE SESIÓN CONCURRENTES
+# ============================================
+# Uso: python benchmarks/bench_login.py [segundos por escenario] [hilos...]
+#
+# Varios hilos inician sesión sin parar mientras otro envía mensajes a
+# /api/analyze. Compara pbkdf2 en el hilo de cada petición (sin límite) con
+# el grupo acotado de app.HASHER: inicios por segundo, latencia, cuántos
+# recibieron 503 y cuánto tarda el chat mientras tanto. Corre en una carpeta
+# temporal; los datos del proyecto no se tocan.
+#
+# Todo pasa en un solo proceso con muchos hilos, como un worker gthread o
+# async_server.py: con workers sync de gunicorn el límite no actúa (ver
+# hashing.HashPool).
+
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORKDIR = tempfile.mkdtemp(prefix='anxiety-bench-login-')
+shutil.copy(os.path.join(ROOT, 'knowledge.json'), WORKDIR)
+os.chdir(WORKDIR)
+os.environ['ANXIETY_KB_RELOAD'] = '0'
+
+import app
+from hashing import HashPool
+from werkzeug.security import generate_password_hash
+
+PASSWORD = 'clave-de-prueba'
+
+
+def percentile(samples, p):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def run(threads, seconds):
+    stop = time.perf_counter() + seconds
+    logins, rejected, chat = [], [0], []
+    lock = threading.Lock()
+
+    def student(n):
+        client = app.app.test_client()
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            response = client.post('/login', json={'username': f'estudiante{n}', 'password': PASSWORD})
+            elapsed = time.perf_counter() - start
+            with lock:
+                if response.status_code == 503:
+                    rejected[0] += 1
+                else:
+                    logins.append(elapsed)
+            if response.status_code == 503:
+                time.sleep(float(response.headers['Retry-After']))
+
+    def chatter():
+        client = app.app.test_client()
+        client.post('/login', json={'username': 'estudiante0', 'password': PASSWORD})
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            client.post('/api/analyze', json={'message': 'tengo mucho estres y no puedo dormir'})
+            chat.append(time.perf_counter() - start)
+            time.sleep(0.01)
+
+    workers = [threading.Thread(target=student, args=(n,)) for n in range(threads)]
+    workers.append(threading.Thread(target=chatter))
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    # Los inicios que empezaron antes del corte terminan después: se divide
+    # por el tiempo real hasta el último
+    return logins, rejected[0], chat, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    levels = [int(n) for n in sys.argv[2:]] or [1, 4, 16, 64]
+
+    # Un solo hash para todos: registrar con pbkdf2 tomaría más que el benchmark
+    pwhash = generate_password_hash(PASSWORD)
+    for n in range(max(levels)):
+        app.store.create_user(f'estudiante{n}', {
+            'password': pwhash, 'created_at': '2025-10-27T14:31:04.742283', 'sessions': []
+        })
+
+    pooled = app.HASHER
+    print(f"Núcleos: {os.cpu_count()}   grupo acotado: {pooled.workers} hilos + {pooled.max_queue} en cola\n")
+    print(f"{'modo':<10} {'hilos':>5} {'login/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'503':>6} {'chat p50':>9} {'chat p95':>9}")
+    for threads in levels:
+        # "sin límite" equivale a hashear en el hilo de cada petición
+        for mode, hasher in (('sin límite', HashPool(threads, 0)), ('acotado', pooled)):
+            app.HASHER = hasher
+            logins, rejected, chat, elapsed = run(threads, seconds)
+            print(f"{mode:<10} {threads:>5} {len(logins) / elapsed:>8.1f} "
+                  f"{statistics.median(logins) * 1000 if logins else 0:>8.0f} {percentile(logins, 0.95) * 1000:>8.0f} "
+                  f"{rejected:>6} {statistics.median(chat) * 1000 if chat else 0:>9.1f} "
+                  f"{percentile(chat, 0.95) * 1000:>9.1f}")
+            if hasher is not pooled:
+                hasher.shutdown()
+
+    app.store.close()
+    os.chdir(ROOT)
+    shutil.rmtree(WORKDIR, ignore_errors=True)
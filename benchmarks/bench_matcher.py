@@ -0,0 +1,114 @@
+# ============================================
+# BENCHMARK - BÚSQUEDA DE PALABRAS CLAVE
+# ============================================
+# Uso: python benchmarks/bench_matcher.py
+
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import KB
+from matcher import KeywordIndex
+
+KNOWLEDGE = KB.snapshot.knowledge
+KNOWLEDGE_INDEX = KB.snapshot.index
+
+
+def naive_match(message_lower):
+    """Búsqueda original: `keyword in mensaje` para cada palabra clave."""
+    found = []
+    for keywords in KNOWLEDGE:
+        for keyword in keywords.split('|'):
+            if keyword in message_lower:
+                found.append(keywords)
+                break
+    return found
+
+
+SHORT = [
+    'estrés',
+    'no puedo dormir',
+    'tengo miedo',
+    'me duele la cabeza y tengo palpitaciones',
+    'hola, como estas?',
+]
+
+LONG = [
+    ' '.join(SHORT * 20),
+    ('últimamente me siento muy cansado, no duermo bien y tengo muchas '
+     'preocupaciones por los exámenes y por mi familia. ') * 15,
+]
+
+
+def bench(name, messages, number):
+    old = timeit.timeit(lambda: [naive_match(m.lower()) for m in messages], number=number)
+    new = timeit.timeit(lambda: [KNOWLEDGE_INDEX.match(m, limit=2) for m in messages], number=number)
+    calls = number * len(messages)
+    print(f"{name:<8} original: {old / calls * 1e6:8.2f} µs/mensaje   "
+          f"índice: {new / calls * 1e6:8.2f} µs/mensaje   ({old / new:.1f}x)")
+
+
+def edit_distance(a, b):
+    """Levenshtein clásico: lo que costaría comparar contra cada palabra clave."""
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def misspell(word, rnd):
+    pos = rnd.randrange(1, len(word))
+    return word[:pos] + word[pos + 1:]
+
+
+def bench_fuzzy(sizes, queries=200):
+    """Latencia de la búsqueda por trigramas según la cantidad de palabras clave."""
+    rnd = random.Random(42)
+    syllables = [c + v for c in 'bcdfglmnprstvz' for v in 'aeiou'] + ['ción', 'mien', 'tra', 'des']
+    print(f"{'palabras':>9}  {'trigramas':>12}  {'distancia de edición':>22}")
+    for size in sizes:
+        words = set()
+        while len(words) < size:
+            words.add(''.join(rnd.choice(syllables) for _ in range(rnd.randint(2, 5))))
+        index = KeywordIndex(sorted(words))
+        probes = [misspell(word, rnd) for word in rnd.sample(sorted(words), queries)]
+        fast = timeit.timeit(lambda: [index.fuzzy_lookup(p) for p in probes], number=1) / queries
+        if size <= 5000:
+            vocabulary = index.vocabulary
+            brute = timeit.timeit(
+                lambda: [min(vocabulary, key=lambda w: edit_distance(p, w)) for p in probes[:20]],
+                number=1) / 20
+            brute = f"{brute * 1e3:19.3f} ms"
+        else:
+            brute = f"{'(omitido)':>22}"
+        print(f"{size:>9}  {fast * 1e3:9.3f} ms  {brute}")
+
+
+if __name__ == '__main__':
+    keywords = sum(len(k.split('|')) for k in KNOWLEDGE)
+    print(f"{len(KNOWLEDGE)} temas, {keywords} palabras clave")
+    bench('cortos', SHORT, 20000)
+    bench('largos', LONG, 500)
+
+    # El índice no da exactamente lo mismo: mostramos en qué cambia
+    for message in ['estrés', 'pánico', 'intenso dolor', 'tengo un examen', 'me mira raro',
+                    'insomio', 'palpitasiones']:
+        old = [k.split('|')[0] for k in naive_match(message.lower())]
+        new = [k.split('|')[0] for k in KNOWLEDGE_INDEX.match(message)]
+        print(f"  {message!r:<20} original: {old}  índice: {new}")
+
+    # Frases comunes que se parecen a palabras de crisis ("acabar", "morir")
+    # sin serlo: nunca deben recibir la respuesta de crisis
+    for message in ['la clase se acaba a las 5', 'se acaban las vacaciones', 'me mori de risa']:
+        new = [k.split('|')[0] for k in KNOWLEDGE_INDEX.match(message)]
+        assert 'suicidio' not in new, (message, new)
+        print(f"  {message!r:<28} índice: {new}")
+
+    print()
+    bench_fuzzy([200, 1000, 5000, 20000, 100000])
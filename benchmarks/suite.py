@@ -0,0 +1,216 @@
+# ============================================
+# BENCHMARK - SUITE COMPLETA
+# ============================================
+# Uso:
+#   python benchmarks/suite.py run [--output bench_results.json] [--quick]
+#   python benchmarks/suite.py compare antes.json despues.json [--threshold 0.10]
+#
+# Todo corre sin red, con datos sintéticos y semilla fija, dentro de una
+# carpeta temporal: users.json/sessions.json del proyecto no se tocan.
+# `compare` termina con código 1 si algún caso empeoró más que el umbral.
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SEED = 2024
+
+FILLER = [
+    'hoy', 'ayer', 'me', 'siento', 'muy', 'un', 'poco', 'la', 'verdad', 'que', 'no', 'sé',
+    'por', 'qué', 'tengo', 'mucho', 'en', 'la', 'universidad', 'casa', 'semana', 'clase',
+    'profesor', 'amigos', 'noche', 'mañana', 'siempre', 'nunca', 'otra', 'vez', 'y', 'pero',
+]
+
+
+def timed(func, repeat):
+    """Ejecuta func `repeat` veces y resume los tiempos en milisegundos."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'runs': repeat,
+        'mean_ms': statistics.fmean(samples),
+        'median_ms': statistics.median(samples),
+        'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        'min_ms': samples[0],
+    }
+
+
+def synthetic_messages(knowledge, count, rnd):
+    """Mensajes en español con 0 a 3 palabras clave mezcladas con relleno."""
+    keywords = [kw for topic in knowledge for kw in topic.split('|')]
+    messages = []
+    for _ in range(count):
+        words = [rnd.choice(FILLER) for _ in range(rnd.randint(2, 25))]
+        for _ in range(rnd.randint(0, 3)):
+            words.insert(rnd.randrange(len(words) + 1), rnd.choice(keywords))
+        messages.append(' '.join(words))
+    return messages
+
+
+def synthetic_users(count, rnd):
+    """Usuarios con la forma de users.json (hash, fecha y sesiones HAM-A)."""
+    users = {}
+    for n in range(count):
+        users[f'estudiante{n}'] = {
+            'password': 'pbkdf2:sha256:600000$' + 'x' * 16 + '$' + 'f' * 64,
+            'created_at': '2025-10-27T14:31:04.742283',
+            'sessions': [{
+                'timestamp': '2025-10-27T14:53:17.382054',
+                'score': rnd.randint(0, 48),
+                'responses': {str(q): rnd.randint(0, 4) for q in range(1, 13)},
+                'general_level': rnd.randint(0, 10),
+            } for _ in range(rnd.randint(0, 4))],
+        }
+    return users
+
+
+def bench_matcher(app, results, quick):
+    rnd = random.Random(SEED)
+    kb = app.KB.snapshot
+    messages = synthetic_messages(kb.knowledge, 500 if quick else 5000, rnd)
+    app.ANALYSIS_CACHE.maxsize = 0
+    results['analyze_message.uncached'] = timed(
+        lambda: [app.analyze_message(m, kb) for m in messages], 3)
+    app.ANALYSIS_CACHE.maxsize = 10000
+    results['analyze_message.cached'] = timed(
+        lambda: [app.analyze_message(m, kb) for m in messages], 3)
+    for name in ('analyze_message.uncached', 'analyze_message.cached'):
+        results[name]['per_message_us'] = results[name]['median_ms'] * 1000 / len(messages)
+
+
+def bench_persistence(storage, results, quick):
+    rnd = random.Random(SEED)
+    for count in (100, 10000) if quick else (100, 10000, 100000):
+        users = synthetic_users(count, rnd)
+        filename = f'bench_users_{count}.json'
+        repeat = 5 if count <= 10000 else 2
+        results[f'save_json.{count}'] = timed(lambda: storage.save_json(filename, users), repeat)
+        results[f'load_json.{count}'] = timed(lambda: storage.load_json(filename), repeat)
+        results[f'save_json.{count}']['bytes'] = os.path.getsize(filename)
+        os.remove(filename)
+
+
+def bench_endpoints(app, results, quick):
+    repeat = 50 if quick else 300
+    client = app.app.test_client()
+    results['render.index'] = timed(lambda: client.get('/'), repeat)
+
+    # Un solo registro: el hash pbkdf2 es lento a propósito
+    client.post('/register', json={'username': 'bench', 'password': 'bench'})
+    client.post('/login', json={'username': 'bench', 'password': 'bench'})
+    results['render.chat'] = timed(lambda: client.get('/chat'), repeat)
+    results['api.analyze'] = timed(
+        lambda: client.post('/api/analyze', json={'message': 'tengo estres y no puedo dormir'}), repeat)
+    payload = {'score': 21, 'responses': {str(q): 2 for q in range(1, 13)}, 'generalLevel': 6}
+    results['api.save'] = timed(lambda: client.post('/api/save', json=payload), repeat)
+    results['api.history'] = timed(lambda: client.get('/api/history'), repeat)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(args):
+    output = os.path.abspath(args.output)
+    workdir = tempfile.mkdtemp(prefix='anxiety-bench-')
+    shutil.copy(os.path.join(ROOT, 'knowledge.json'), workdir)
+    os.chdir(workdir)
+    os.environ['ANXIETY_KB_RELOAD'] = '0'
+    os.environ.setdefault('ANXIETY_STORAGE', 'json')
+
+    import app
+    import storage
+
+    results = {}
+    try:
+        bench_matcher(app, results, args.quick)
+        bench_persistence(storage, results, args.quick)
+        bench_endpoints(app, results, args.quick)
+    finally:
+        app.store.close()
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'storage': os.environ['ANXIETY_STORAGE'],
+            'quick': args.quick,
+        },
+        'results': results,
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    for name, stats in results.items():
+        print(f"{name:<28} mediana {stats['median_ms']:10.3f} ms   p95 {stats['p95_ms']:10.3f} ms")
+    print(f"\nResultados en {output}")
+
+
+def compare(args):
+    with open(args.before, 'r', encoding='utf-8') as f:
+        before = json.load(f)['results']
+    with open(args.after, 'r', encoding='utf-8') as f:
+        after = json.load(f)['results']
+
+    regressions = []
+    for name in sorted(set(before) & set(after)):
+        old, new = before[name]['median_ms'], after[name]['median_ms']
+        change = (new - old) / old if old else 0.0
+        flag = ''
+        if change > args.threshold:
+            flag = '  ⚠️ REGRESIÓN'
+            regressions.append(name)
+        print(f"{name:<28} {old:10.3f} → {new:10.3f} ms  ({change:+.1%}){flag}")
+    for name in sorted(set(before) ^ set(after)):
+        print(f"{name:<28} (solo en uno de los archivos)")
+
+    if regressions:
+        print(f"\n{len(regressions)} caso(s) más lentos que el umbral de {args.threshold:.0%}")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks de Anxiety Chat')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    cmd = commands.add_parser('run', help='Ejecuta la suite y guarda los resultados en JSON')
+    cmd.add_argument('--output', default='bench_results.json')
+    cmd.add_argument('--quick', action='store_true', help='Sin el caso de 100k usuarios y con menos repeticiones')
+    cmd.set_defaults(func=run)
+
+    cmd = commands.add_parser('compare', help='Compara dos resultados y marca regresiones')
+    cmd.add_argument('before')
+    cmd.add_argument('after')
+    cmd.add_argument('--threshold', type=float, default=0.10)
+    cmd.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# ============================================
+# ANXIETY CHAT - CACHÉ LRU
+# ============================================
+
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Caché acotada (menos usado recientemente) segura entre hilos.
+
+    Cada valor se guarda junto con la versión de los datos de los que salió:
+    cuando llega una versión distinta (por ejemplo, cambió la base de
+    conocimiento) la caché se vacía sola.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _check_version(self, version):
+        if version != self.version:
+            self._data.clear()
+            self.version = version
+
+    def get(self, key, version=None):
+        with self._lock:
+            self._check_version(version)
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, version=None):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._check_version(version)
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
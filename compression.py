@@ -0,0 +1,50 @@
+# ============================================
+# ANXIETY CHAT - COMPRESIÓN DE RESPUESTAS
+# ============================================
+
+import gzip
+
+try:
+    import brotli
+except ImportError:  # opcional: sin el paquete se ofrece solo gzip
+    brotli = None
+
+# Tipos que vale la pena comprimir (las imágenes ya vienen comprimidas)
+COMPRESSIBLE = {'application/json', 'text/html', 'text/css', 'text/javascript'}
+MIN_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def choose_encoding(accept_encodings):
+    """Mejor codificación aceptada por el cliente: br, luego gzip; None si ninguna."""
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress_response(response, accept_encodings, min_size=MIN_SIZE):
+    """Comprime en su lugar el cuerpo de response si es texto y pasa de min_size bytes."""
+    response.vary.add('Accept-Encoding')
+    if (response.direct_passthrough or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE):
+        return response
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+    encoding = choose_encoding(accept_encodings)
+    if encoding is None:
+        return response
+
+    if encoding == 'br':
+        response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+    else:
+        response.set_data(gzip.compress(data, GZIP_LEVEL, mtime=0))
+    response.headers['Content-Encoding'] = encoding
+    # El cuerpo cambió de bytes: el ETag pasa a ser débil (mismo contenido)
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
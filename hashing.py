@@ -0,0 +1,101 @@
+# ============================================
+# ANXIETY CHAT - HASH DE CONTRASEÑAS ACOTADO
+# ============================================
+
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class Overloaded(Exception):
+    """No hay lugar en la cola de hashes; reintentar en `retry_after` segundos."""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Cola de hashes llena; reintentar en {retry_after} s')
+        self.retry_after = retry_after
+
+
+class HashPool:
+    """Grupo fijo de hilos para pbkdf2 con una cola de espera acotada.
+
+    hashlib suelta el GIL mientras calcula pbkdf2, así que `workers` hilos usan
+    hasta `workers` núcleos y el resto de las rutas sigue atendiéndose. Cuando
+    ya hay `workers + max_queue` hashes en curso o esperando, los siguientes se
+    rechazan enseguida con Overloaded en vez de hacer fila sin límite.
+
+    El grupo y el límite son por proceso: solo actúan donde un proceso atiende
+    varias peticiones a la vez (gunicorn con workers gthread o gevent, o
+    async_server.py). Con workers sync de gunicorn cada proceso tiene una sola
+    petición en curso, la cola nunca se llena (no hay 503) y el worker queda
+    ocupado durante todo el hash; ahí el límite real es la cantidad de workers.
+    """
+
+    def __init__(self, workers=None, max_queue=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = self.workers * 4 if max_queue is None else max_queue
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='pbkdf2')
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+        self.average = 0.5  # segundos por hash, promedio móvil
+
+    def _run(self, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.average += (elapsed - self.average) * 0.2
+
+    def submit_future(self, func, *args):
+        """Encola func en el grupo y devuelve su Future, o lanza Overloaded. El
+        lugar en la cola se libera al terminar, así que se puede esperar sin
+        ocupar un hilo (asyncio.wrap_future)."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise Overloaded(self.retry_after())
+        with self._lock:
+            self.in_flight += 1
+        try:
+            future = self._executor.submit(self._run, func, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def submit(self, func, *args):
+        """Ejecuta func en el grupo y espera el resultado, o lanza Overloaded."""
+        return self.submit_future(func, *args).result()
+
+    def retry_after(self):
+        """Segundos estimados hasta que la cola actual se vacíe (mínimo 1)."""
+        with self._lock:
+            return max(1, math.ceil(self.in_flight * self.average / self.workers))
+
+    def generate(self, password):
+        return self.submit(generate_password_hash, password)
+
+    def check(self, pwhash, password):
+        return self.submit(check_password_hash, pwhash, password)
+
+    def generate_future(self, password):
+        return self.submit_future(generate_password_hash, password)
+
+    def check_future(self, pwhash, password):
+        return self.submit_future(check_password_hash, pwhash, password)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
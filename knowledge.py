@@ -0,0 +1,203 @@
+# ============================================
+# ANXIETY CHAT - BASE DE CONOCIMIENTO
+# ============================================
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from types import MappingProxyType
+
+from matcher import FUZZY_THRESHOLD, TopicIndex
+from storage import load_json, write_file
+
+logger = logging.getLogger(__name__)
+
+# Respuesta cuando ningún tema coincide; se guarda en el historial como un tema más
+GENERAL_TOPIC = 'general'
+GENERAL_MESSAGE = ('Gracias por compartir eso conmigo. Tus emociones son importantes. '
+                   '¿Podrías contarme un poco más sobre cómo te has sentido?')
+
+
+def topic_id(keywords, data):
+    """Id estable del tema: su campo "id" o, si no tiene, la primera palabra clave."""
+    return data.get('id') or keywords.split('|')[0].strip().replace(' ', '_')
+
+
+class Snapshot:
+    """Base de conocimiento compilada e inmutable.
+
+    Nunca se modifica: cuando cambia el archivo se construye otra y se
+    reemplaza la referencia, así cada petición usa de principio a fin la
+    instantánea que tomó al empezar.
+    """
+
+    def __init__(self, data, fuzzy_threshold=FUZZY_THRESHOLD, mtime=None):
+        # Huella del contenido: identifica qué versión tiene cada worker
+        self.version = hashlib.sha1(
+            json.dumps(data, ensure_ascii=False, sort_keys=True).encode('utf-8')
+        ).hexdigest()[:12]
+        self.knowledge = MappingProxyType(data['knowledge'])
+        self.questions = tuple(data['ham_a_questions'])
+        self.index = TopicIndex(data['knowledge'], fuzzy_threshold)
+        self.mtime = mtime
+        # Temas por id: lo que se guarda en el historial de chat
+        self.topic_ids = {}
+        self.texts = {GENERAL_TOPIC: (GENERAL_MESSAGE, None)}
+        for keywords, topic in data['knowledge'].items():
+            tid = topic_id(keywords, topic)
+            if tid in self.texts:
+                raise ValueError(f'Id de tema repetido en la base de conocimiento: {tid}')
+            self.topic_ids[keywords] = tid
+            self.texts[tid] = (topic['respuesta'], topic['recomendacion'])
+
+
+def load_snapshot(filename, fuzzy_threshold=FUZZY_THRESHOLD):
+    mtime = os.stat(filename).st_mtime_ns
+    with open(filename, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return Snapshot(data, fuzzy_threshold, mtime)
+
+
+class TopicArchive:
+    """Textos de cada versión de la base de conocimiento que llegó a usarse.
+
+    El historial de chat guarda solo ids de temas y la versión; con este
+    archivo (version → id → [respuesta, recomendación]) se recuperan los
+    textos tal como se mostraron aunque knowledge.json haya cambiado.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.versions = load_json(filename)
+        self._lock = threading.Lock()
+
+    def record(self, snapshot):
+        with self._lock:
+            if snapshot.version in self.versions:
+                return
+            # Otro worker pudo agregar versiones: se relee antes de escribir
+            self.versions = load_json(self.filename)
+            self.versions[snapshot.version] = {tid: list(texts) for tid, texts in snapshot.texts.items()}
+            write_file(self.filename, json.dumps(self.versions, ensure_ascii=False, indent=2))
+
+    def texts(self, version):
+        return self.versions.get(version)
+
+
+def compact_chat(entry, version):
+    """Entrada de chat con solo los ids de las respuestas y la versión."""
+    return {
+        'timestamp': entry['timestamp'],
+        'message': entry['message'],
+        'kb_version': version,
+        'responses': [response['topic'] for response in entry['responses']],
+    }
+
+
+def resolve_chat(entry, texts, fallback):
+    """Entrada de chat con los textos de cada tema (la inversa de compact_chat).
+
+    `texts` son los de la versión de la entrada (o None si no está archivada)
+    y `fallback` los de la versión actual. Las entradas anteriores, con los
+    textos copiados, se devuelven tal cual.
+    """
+    if not entry['responses'] or isinstance(entry['responses'][0], dict):
+        return entry
+    responses = []
+    for tid in entry['responses']:
+        message, recommendation = (texts or {}).get(tid) or fallback.get(tid) or (None, None)
+        responses.append({
+            'type': 'general' if tid == GENERAL_TOPIC else 'symptom',
+            'topic': tid,
+            'message': message,
+            'recommendation': recommendation,
+        })
+    return {'timestamp': entry['timestamp'], 'message': entry['message'],
+            'kb_version': entry.get('kb_version'), 'responses': responses}
+
+
+class KnowledgeBase:
+    """Guarda la instantánea vigente y la recarga en segundo plano.
+
+    Cada `reload_interval` segundos revisa si el archivo cambió; si es así
+    compila una instantánea nueva fuera de las peticiones y la intercambia de
+    un solo golpe. Si el archivo nuevo tiene errores se mantiene la anterior.
+    """
+
+    def __init__(self, filename, fuzzy_threshold=FUZZY_THRESHOLD, reload_interval=5.0,
+                 archive_file=None):
+        self.filename = filename
+        self.fuzzy_threshold = fuzzy_threshold
+        self.archive = TopicArchive(archive_file) if archive_file else None
+        self.reload_interval = reload_interval
+        self._snapshot = load_snapshot(filename, fuzzy_threshold)
+        self._archive(self._snapshot)
+        self._failed_mtime = None
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+
+    @property
+    def snapshot(self):
+        self._start()
+        return self._snapshot
+
+    def _start(self):
+        # Se arranca en el primer uso: con gunicorn --preload el fork ocurre
+        # después de importar la app y cada worker necesita su propio hilo
+        # (con candado: dos peticiones a la vez no deben arrancar dos hilos)
+        if self.reload_interval > 0 and self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    self._thread = threading.Thread(
+                        target=self._watch, args=(self.reload_interval,), name='knowledge-reload',
+                        daemon=True
+                    )
+                    self._thread.start()
+                    self._pid = os.getpid()
+
+    def _watch(self, interval):
+        while True:
+            time.sleep(interval)
+            self.reload_if_changed()
+
+    def reload_if_changed(self):
+        """Recarga si el archivo cambió; devuelve True si hubo intercambio."""
+        try:
+            mtime = os.stat(self.filename).st_mtime_ns
+        except OSError:
+            return False
+        if mtime in (self._snapshot.mtime, self._failed_mtime):
+            return False
+        try:
+            snapshot = load_snapshot(self.filename, self.fuzzy_threshold)
+        except Exception:
+            logger.exception('No se pudo recargar %s; se mantiene la versión %s',
+                             self.filename, self._snapshot.version)
+            self._failed_mtime = mtime
+            return False
+        self._snapshot = snapshot
+        self._archive(snapshot)
+        logger.info('Base de conocimiento recargada: versión %s', snapshot.version)
+        return True
+
+    def _archive(self, snapshot):
+        if self.archive is None:
+            return
+        try:
+            self.archive.record(snapshot)
+        except OSError:
+            logger.exception('No se pudieron archivar los textos de la versión %s', snapshot.version)
+
+    def resolve(self, entry):
+        """Textos de una entrada del historial de chat, según la versión con que se guardó."""
+        current = self.snapshot
+        version = entry.get('kb_version')
+        if version == current.version:
+            texts = current.texts
+        else:
+            texts = self.archive.texts(version) if self.archive else None
+        return resolve_chat(entry, texts, current.texts)
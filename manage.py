@@ -0,0 +1,131 @@
+# ============================================
+# ANXIETY CHAT - COMANDOS DE MANTENIMIENTO
+# ============================================
+
+import argparse
+import os
+
+from knowledge import TopicArchive, compact_chat, load_snapshot
+from serialization import CODECS, get_codec
+from stats import compute_stats
+from storage import JournalStore, ShardStore, SqliteStore, iter_json_items, load_json, save_json
+
+
+def migrate_sqlite(args):
+    store = SqliteStore(args.db)
+    users, chats = store.import_json(args.users, args.sessions)
+    store.close()
+    print(f"✓ {users} usuarios y {chats} mensajes migrados a {args.db}")
+
+
+def compact_journal(args):
+    # Con la app detenida: cada proceso tiene su propia foto de los datos
+    size = os.path.getsize(args.journal) if os.path.exists(args.journal) else 0
+    store = JournalStore(args.users, args.sessions, args.journal, fsync='always', codec=args.codec)
+    store.compact()
+    store.close()
+    print(f"✓ {args.journal} ({size / 1024:.0f} KiB) volcado en {args.users} y {args.sessions}")
+
+
+def shard(args):
+    store = ShardStore(args.data_dir, codec=args.codec)
+    users, chats = store.import_json(args.users, args.sessions)
+    print(f"✓ {users} usuarios y {chats} mensajes repartidos en {args.data_dir}/")
+
+
+def backfill_stats(args):
+    # Con la app detenida: el backend json reescribiría users.json desde memoria
+    users = load_json(args.users)
+    for record in users.values():
+        record['stats'] = compute_stats(record.get('sessions', []))
+    save_json(args.users, users, fsync=True, codec=get_codec(args.codec))
+    print(f"✓ Estadísticas HAM-A calculadas para {len(users)} usuarios en {args.users}")
+
+
+def compact_entry(entry, lookups):
+    """Versión compacta de una entrada con los textos copiados, o None si
+    algún texto no corresponde a un tema de ninguna versión archivada."""
+    for version, lookup in lookups.items():
+        topics = [lookup.get((r.get('message'), r.get('recommendation'))) for r in entry['responses']]
+        if None not in topics:
+            responses = [{'topic': tid} for tid in topics]
+            return compact_chat({**entry, 'responses': responses}, version)
+    return None
+
+
+def compact_sessions(args):
+    # Con la app detenida: los backends json reescribirían sessions.json desde memoria
+    archive = TopicArchive(args.archive)
+    current = load_snapshot(args.knowledge)
+    archive.record(current)
+    # Texto → id de tema en cada versión archivada, la actual primero
+    versions = [current.version] + [v for v in archive.versions if v != current.version]
+    lookups = {version: {tuple(texts): tid for tid, texts in archive.texts(version).items()}
+               for version in versions}
+
+    size = os.path.getsize(args.sessions)
+    sessions = {}
+    compacted = kept = 0
+    for username, entries in iter_json_items(args.sessions):
+        for n, entry in enumerate(entries):
+            if entry['responses'] and isinstance(entry['responses'][0], dict):
+                compact = compact_entry(entry, lookups)
+                if compact is None:
+                    kept += 1
+                else:
+                    entries[n] = compact
+                    compacted += 1
+        sessions[username] = entries
+    save_json(args.sessions, sessions, fsync=True, codec=get_codec(args.codec))
+    print(f"✓ {compacted} mensajes compactados ({kept} con textos desconocidos quedan igual); "
+          f"{args.sessions}: {size / 1024:.0f} KiB → {os.path.getsize(args.sessions) / 1024:.0f} KiB")
+
+
+def add_codec_option(cmd):
+    # El mismo formato que use la app (ANXIETY_CODEC); al leer se detecta solo
+    cmd.add_argument('--codec', choices=list(CODECS), default=os.environ.get('ANXIETY_CODEC', 'json'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mantenimiento de Anxiety Chat')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    cmd = commands.add_parser('migrate-sqlite', help='Copia users.json/sessions.json a SQLite')
+    cmd.add_argument('--db', default='anxiety.db')
+    cmd.add_argument('--users', default='users.json')
+    cmd.add_argument('--sessions', default='sessions.json')
+    cmd.set_defaults(func=migrate_sqlite)
+
+    cmd = commands.add_parser('compact-journal', help='Vuelca journal.jsonl en users.json/sessions.json')
+    cmd.add_argument('--users', default='users.json')
+    cmd.add_argument('--sessions', default='sessions.json')
+    cmd.add_argument('--journal', default='journal.jsonl')
+    add_codec_option(cmd)
+    cmd.set_defaults(func=compact_journal)
+
+    cmd = commands.add_parser('shard', help='Reparte users.json/sessions.json en un archivo por usuario')
+    cmd.add_argument('--data-dir', default='data')
+    cmd.add_argument('--users', default='users.json')
+    cmd.add_argument('--sessions', default='sessions.json')
+    add_codec_option(cmd)
+    cmd.set_defaults(func=shard)
+
+    cmd = commands.add_parser('backfill-stats', help='Calcula las estadísticas HAM-A de los usuarios existentes')
+    cmd.add_argument('--users', default='users.json')
+    add_codec_option(cmd)
+    cmd.set_defaults(func=backfill_stats)
+
+    cmd = commands.add_parser('compact-sessions',
+                              help='Reemplaza los textos copiados en sessions.json por ids de temas')
+    cmd.add_argument('--sessions', default='sessions.json')
+    cmd.add_argument('--knowledge', default='knowledge.json')
+    cmd.add_argument('--archive', default='knowledge_versions.json')
+    add_codec_option(cmd)
+    cmd.set_defaults(func=compact_sessions)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+# ============================================
+# ANXIETY CHAT - BÚSQUEDA DE PALABRAS CLAVE
+# ============================================
+
+import re
+import unicodedata
+
+# Las palabras clave de al menos MIN_PREFIX letras también aceptan
+# terminaciones ("preocupa" → "preocupaciones"); las cortas ("ex", "ira",
+# "solo") solo cuentan como palabra completa
+MIN_PREFIX = 5
+
+# Palabras ya resueltas que se recuerdan antes de vaciar la memoria
+TOKEN_CACHE_SIZE = 50000
+
+# Búsqueda tolerante a errores ("insomio" → "insomnio"): similitud mínima
+# (coeficiente de Dice sobre trigramas) y largo mínimo de las palabras
+FUZZY_THRESHOLD = 0.6
+FUZZY_MIN_LENGTH = 4
+
+_TOKEN_RE = re.compile(r'\w+')
+_COMBINING_RE = re.compile('[\u0300-\u036f]')
+
+
+def normalize(text):
+    """Minúsculas y sin tildes: 'Estrés' → 'estres', 'Sueño' → 'sueno'."""
+    text = text.casefold()
+    if text.isascii():
+        return text
+    return _COMBINING_RE.sub('', unicodedata.normalize('NFKD', text))
+
+def tokenize(text):
+    return _TOKEN_RE.findall(normalize(text))
+
+def trigrams(word):
+    padded = f' {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class KeywordIndex:
+    """Índice invertido de palabras normalizadas a un grupo de temas de KNOWLEDGE.
+
+    Se construye una sola vez. Buscar un mensaje cuesta unas pocas consultas a
+    diccionarios por palabra: la palabra completa, sus raíces de MIN_PREFIX
+    letras o más y las frases de varias palabras que empiezan en ella. Si una
+    palabra no coincide con nada, se buscan en el índice de trigramas las
+    palabras clave parecidas, sin calcular distancias contra todas.
+    """
+
+    def __init__(self, topics, fuzzy_threshold=FUZZY_THRESHOLD):
+        self.topics = list(topics)
+        self.fuzzy_threshold = fuzzy_threshold
+        # Índices vecinos: una palabra que allí coincide tal cual no se busca
+        # aquí por parecido
+        self.others = []
+        self.words = {}      # palabra completa → temas
+        self.prefixes = {}   # raíz → temas (palabras clave largas)
+        self.phrases = {}    # tupla de palabras → temas
+        for i, keywords in enumerate(self.topics):
+            for keyword in keywords.split('|'):
+                tokens = tuple(tokenize(keyword))
+                if len(tokens) > 1:
+                    self.phrases.setdefault(tokens, set()).add(i)
+                elif tokens:
+                    self.words.setdefault(tokens[0], set()).add(i)
+                    if len(tokens[0]) >= MIN_PREFIX:
+                        self.prefixes.setdefault(tokens[0], set()).add(i)
+        # Primeras MIN_PREFIX letras de las raíces: descarta rápido casi todas las palabras
+        self.stems = {prefix[:MIN_PREFIX] for prefix in self.prefixes}
+        self.phrase_starts = {phrase[0] for phrase in self.phrases}
+        self.phrase_lengths = sorted({len(phrase) for phrase in self.phrases})
+        self._build_trigrams()
+        self._token_cache = {}
+
+    def _build_trigrams(self):
+        self.vocabulary = [word for word in self.words if len(word) >= FUZZY_MIN_LENGTH]
+        self.trigram_counts = []
+        # (primera letra, trigrama) → posiciones en self.vocabulary; casi nunca
+        # se equivoca la primera letra y así "intenso" no se confunde con "tenso"
+        self.trigram_index = {}
+        for n, word in enumerate(self.vocabulary):
+            grams = trigrams(word)
+            self.trigram_counts.append(len(grams))
+            for gram in grams:
+                self.trigram_index.setdefault((word[0], gram), []).append(n)
+
+    def fuzzy_lookup(self, token):
+        """Palabras clave más parecidas a token con similitud >= fuzzy_threshold."""
+        grams = trigrams(token)
+        shared = {}
+        for gram in grams:
+            for n in self.trigram_index.get((token[0], gram), ()):
+                shared[n] = shared.get(n, 0) + 1
+        best, matches = self.fuzzy_threshold, []
+        for n, count in shared.items():
+            score = 2 * count / (len(grams) + self.trigram_counts[n])
+            if score > best:
+                best, matches = score, [self.vocabulary[n]]
+            elif score == best:
+                matches.append(self.vocabulary[n])
+        return matches
+
+    def exact_topics(self, token):
+        topics = set(self.words.get(token, ()))
+        if token[:MIN_PREFIX] in self.stems:
+            for end in range(MIN_PREFIX, len(token)):
+                topics |= self.prefixes.get(token[:end], set())
+        return topics
+
+    def _token_topics(self, token):
+        topics = self._token_cache.get(token)
+        if topics is None:
+            topics = self.exact_topics(token)
+            if (not topics and self.fuzzy_threshold < 1 and len(token) >= FUZZY_MIN_LENGTH
+                    and not any(other.exact_topics(token) for other in self.others)):
+                for word in self.fuzzy_lookup(token):
+                    topics |= self.words[word]
+            topics = frozenset(topics)
+            if len(self._token_cache) >= TOKEN_CACHE_SIZE:
+                self._token_cache.clear()
+            self._token_cache[token] = topics
+        return topics
+
+    def _phrase_topics(self, tokens, start):
+        topics = set()
+        for pos, token in enumerate(tokens):
+            if token == start:
+                for length in self.phrase_lengths:
+                    topics |= self.phrases.get(tuple(tokens[pos:pos + length]), set())
+        return topics
+
+    def match_tokens(self, tokens, limit=None):
+        """Temas mencionados, en el orden de self.topics; con limit, los primeros limit."""
+        found = set()
+        cache = self._token_cache
+        # Cada palabra distinta se revisa una sola vez
+        for token in dict.fromkeys(tokens):
+            topics = cache.get(token)
+            if topics is None:
+                topics = self._token_topics(token)
+            if token in self.phrase_starts:
+                topics = topics | self._phrase_topics(tokens, token)
+            found |= topics
+            # Solo se puede parar antes si ya están los limit primeros temas
+            if limit is not None and found.issuperset(range(limit)):
+                break
+        return [self.topics[i] for i in sorted(found)[:limit]]
+
+
+class TopicIndex:
+    """Busca los temas de KNOWLEDGE en un mensaje y los ordena por prioridad.
+
+    Los temas con "prioridad" (crisis) tienen su propio índice pequeño que se
+    revisa primero: siempre encabezan la respuesta, de mayor a menor
+    prioridad, y si ya completan `limit` no se busca nada más. El resto va en
+    el orden de KNOWLEDGE, como antes de separar los temas de crisis.
+
+    El índice de crisis no busca por parecido: "se acaba" o "me morí de risa"
+    se parecen demasiado a "acabar" y "morir", y un falso positivo ahí
+    encabezaría la respuesta con la línea de crisis.
+    """
+
+    def __init__(self, knowledge, fuzzy_threshold=FUZZY_THRESHOLD):
+        priority = {keywords: data.get('prioridad', 0) for keywords, data in knowledge.items()}
+        urgent = sorted((k for k in knowledge if priority[k] > 0), key=lambda k: -priority[k])
+        self.urgent = KeywordIndex(urgent, fuzzy_threshold=1)
+        self.general = KeywordIndex([k for k in knowledge if priority[k] <= 0], fuzzy_threshold)
+        self.urgent.others = [self.general]
+        self.general.others = [self.urgent]
+        self._urgent_rank = {keywords: n for n, keywords in enumerate(urgent)}
+
+    def match(self, text, limit=None):
+        """Devuelve hasta limit claves de KNOWLEDGE mencionadas en text, las más urgentes primero."""
+        return self.match_tokens(tokenize(text), limit)
+
+    def match_tokens(self, tokens, limit=None):
+        found = sorted(self.urgent.match_tokens(tokens), key=self._urgent_rank.get)
+        if limit is not None:
+            if len(found) >= limit:
+                return found[:limit]
+            return found + self.general.match_tokens(tokens, limit - len(found))
+        return found + self.general.match_tokens(tokens)
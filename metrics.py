@@ -0,0 +1,260 @@
+# ============================================
+# ANXIETY CHAT - MÉTRICAS (FORMATO PROMETHEUS)
+# ============================================
+
+import atexit
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from storage import write_file
+
+# Límites (en segundos) de los histogramas de latencia
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    'anxiety_http_requests_total': ('counter', 'Peticiones atendidas por ruta, método y estado'),
+    'anxiety_http_request_duration_seconds': ('histogram', 'Latencia de cada ruta'),
+    'anxiety_phase_duration_seconds': ('histogram', 'Duración de las fases internas (análisis, guardado, hash)'),
+    'anxiety_users_db_size': ('gauge', 'Usuarios registrados'),
+    'anxiety_sessions_db_size': ('gauge', 'Usuarios con mensajes de chat guardados'),
+}
+
+
+# Cada cuántos segundos un worker recalcula sus gauges en segundo plano (el
+# que responde a /metrics siempre los recalcula)
+GAUGE_INTERVAL = 15.0
+
+
+def process_group():
+    # El maestro de gunicorn y sus workers comparten el grupo de procesos; cada
+    # arranque (gunicorn, python app.py o async_server.py, desde una terminal
+    # o desde systemd) abre uno nuevo
+    return os.getpgrp() if hasattr(os, 'getpgrp') else os.getppid()
+
+
+def default_directory():
+    return os.path.join(tempfile.gettempdir(), f'anxiety-metrics-{process_group()}')
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class Metrics:
+    """Contadores e histogramas del proceso, sumados entre procesos al consultar.
+
+    Cada proceso guarda sus valores en <directory>/<pid>.json cada
+    `flush_interval` segundos (y antes de responder a /metrics), junto con su
+    grupo de procesos. render() suma los archivos del grupo actual: los
+    contadores de un worker que gunicorn reinició siguen contando, y los de
+    arranques anteriores (otro grupo) se ignoran y se borran. Los gauges
+    (`gauges` devuelve {nombre: valor}) son la vista de cada proceso sobre
+    los mismos datos: se toma el máximo entre los procesos vivos.
+    """
+
+    def __init__(self, directory=None, flush_interval=1.0, gauges=None):
+        self.directory = directory or default_directory()
+        os.makedirs(self.directory, exist_ok=True)
+        self.flush_interval = flush_interval
+        self.gauge_source = gauges
+        self.gauges = {}
+        self._gauges_at = None
+        self.counters = {}    # (nombre, etiquetas) → valor
+        self.histograms = {}  # (nombre, etiquetas) → [cubetas..., suma, cantidad]
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self._remove_stale()
+        atexit.register(self.flush)
+
+    def _remove_stale(self):
+        group = process_group()
+        for pid, data in self._read_files():
+            if data.get('group') != group and not pid_alive(pid):
+                try:
+                    os.unlink(os.path.join(self.directory, f'{pid}.json'))
+                except OSError:
+                    pass
+
+    def _start(self):
+        # Se arranca en el primer uso: con gunicorn --preload el fork ocurre
+        # después de importar la app y cada worker necesita su propio hilo
+        # (con candado: dos peticiones a la vez no deben arrancar dos hilos)
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    if self._pid is not None:
+                        # Copia heredada por fork: esos valores ya cuentan en
+                        # el archivo del proceso padre
+                        with self._lock:
+                            self.counters, self.histograms, self.gauges = {}, {}, {}
+                            self._gauges_at = None
+                    self._thread = threading.Thread(target=self._run, name='metrics', daemon=True)
+                    self._thread.start()
+                    self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    # ---------- Registro ----------
+
+    def inc(self, name, labels=(), amount=1):
+        self._start()
+        with self._lock:
+            key = (name, tuple(labels))
+            self.counters[key] = self.counters.get(key, 0) + amount
+            self._dirty = True
+
+    def observe(self, name, labels, seconds):
+        self._start()
+        with self._lock:
+            key = (name, tuple(labels))
+            values = self.histograms.get(key)
+            if values is None:
+                values = self.histograms[key] = [0] * (len(BUCKETS) + 3)
+            values[bisect.bisect_left(BUCKETS, seconds)] += 1
+            values[-2] += seconds
+            values[-1] += 1
+            self._dirty = True
+
+    def observe_request(self, route, method, status, seconds):
+        self.inc('anxiety_http_requests_total',
+                 (('route', route), ('method', method), ('status', str(status))))
+        self.observe('anxiety_http_request_duration_seconds', (('route', route),), seconds)
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('anxiety_phase_duration_seconds', (('phase', name),),
+                         time.perf_counter() - start)
+
+    def timed(self, name, func):
+        """Envuelve func para medirla como la fase `name`."""
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    # ---------- Archivos por proceso ----------
+
+    def _refresh_gauges(self, force=False):
+        if self.gauge_source is None:
+            return
+        now = time.monotonic()
+        if force or self._gauges_at is None or now - self._gauges_at >= GAUGE_INTERVAL:
+            gauges = self.gauge_source()
+            with self._lock:
+                self._gauges_at = now
+                if gauges != self.gauges:
+                    self.gauges = gauges
+                    self._dirty = True
+
+    def flush(self, refresh=False):
+        self._refresh_gauges(refresh)
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {
+                'group': process_group(),
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, labels, values] for (name, labels), values in self.histograms.items()],
+                'gauges': self.gauges,
+            }
+            self._dirty = False
+        write_file(os.path.join(self.directory, f'{os.getpid()}.json'), json.dumps(data))
+
+    def _read_files(self):
+        """(pid, datos) de cada archivo de la carpeta."""
+        for filename in os.listdir(self.directory):
+            name, ext = os.path.splitext(filename)
+            if ext != '.json' or not name.isdigit():
+                continue
+            try:
+                with open(os.path.join(self.directory, filename), 'r', encoding='utf-8') as f:
+                    yield int(name), json.load(f)
+            except (OSError, ValueError):
+                continue
+
+    def collect(self):
+        """Suma los contadores e histogramas de los procesos de este arranque y
+        toma el máximo de los gauges de los que siguen vivos."""
+        self.flush(refresh=True)
+        group = process_group()
+        counters, histograms, gauges = {}, {}, {}
+        for pid, data in self._read_files():
+            if data.get('group') != group:
+                continue
+            if pid_alive(pid):
+                for name, value in data.get('gauges', {}).items():
+                    gauges[name] = max(gauges.get(name, value), value)
+            for name, labels, value in data['counters']:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, values in data['histograms']:
+                key = (name, tuple(map(tuple, labels)))
+                total = histograms.setdefault(key, [0] * len(values))
+                for i, value in enumerate(values):
+                    total[i] += value
+        return counters, histograms, gauges
+
+    # ---------- Exposición ----------
+
+    def render(self):
+        """Texto en formato de exposición de Prometheus."""
+        counters, histograms, gauges = self.collect()
+        lines = []
+        described = set()
+
+        def describe(name):
+            if name not in described:
+                described.add(name)
+                kind, text = HELP[name]
+                lines.append(f'# HELP {name} {text}')
+                lines.append(f'# TYPE {name} {kind}')
+
+        for (name, labels), value in sorted(counters.items()):
+            describe(name)
+            lines.append(f'{name}{format_labels(labels)} {value}')
+
+        for (name, labels), values in sorted(histograms.items()):
+            describe(name)
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), values):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels(labels + (("le", str(bound)),))} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {values[-2]}')
+            lines.append(f'{name}_count{format_labels(labels)} {values[-1]}')
+
+        for name, value in sorted(gauges.items()):
+            describe(name)
+            lines.append(f'{name} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                     for key, value in labels)
+    return '{' + pairs + '}'
@@ -0,0 +1,155 @@
+# ============================================
+# ANXIETY CHAT - PERFILADO POR MUESTREO
+# ============================================
+
+import cProfile
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import g, request
+
+
+def collapse(frame):
+    """Pila en formato "folded" (flamegraph.pl, speedscope): raíz;...;hoja."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """Hilo que anota cada `interval` segundos la pila de los hilos registrados.
+
+    Solo despierta mientras hay peticiones en curso; el costo para cada
+    petición es registrarse y retirarse de un diccionario.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.active = {}  # id del hilo → Counter de pilas
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def start(self, ident):
+        with self._lock:
+            self.active[ident] = Counter()
+        self._wake.set()
+
+    def stop(self, ident):
+        with self._lock:
+            return self.active.pop(ident, Counter())
+
+    def _run(self):
+        while True:
+            if not self.active:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, stacks in self.active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stacks[collapse(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+class Profiler:
+    """Perfila 1 de cada `every` peticiones con cProfile y, si se indica
+    `slow_ms`, guarda las pilas muestreadas de las peticiones más lentas.
+
+    Cada perfil queda en `directory` como <fecha>_<ruta>_<ms>ms.prof (cProfile,
+    se abre con pstats o snakeviz) o .folded (pilas muestreadas), junto a un
+    .json con la ruta, el método, el estado y la duración. Se conservan los
+    `keep` perfiles más recientes.
+    """
+
+    def __init__(self, directory='profiles', every=100, slow_ms=None, keep=200, interval=0.005):
+        self.directory = directory
+        self.every = every
+        self.slow_ms = slow_ms
+        self.keep = keep
+        self.sampler = StackSampler(interval) if slow_ms else None
+        self._counter = itertools.count(1)
+        self._files_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def init_app(self, app):
+        app.before_request(self._before)
+        app.after_request(self._after)
+        app.teardown_request(self._teardown)
+
+    def _before(self):
+        g.profile_start = time.perf_counter()
+        g.profile_status = 500
+        if self.every and next(self._counter) % self.every == 0:
+            g.profile = cProfile.Profile()
+            g.profile.enable()
+        elif self.sampler is not None:
+            g.profile = None
+            self.sampler.start(threading.get_ident())
+
+    def _after(self, response):
+        g.profile_status = response.status_code
+        return response
+
+    def _teardown(self, exc):
+        # teardown corre también cuando la vista lanzó una excepción
+        if 'profile_start' not in g:
+            return
+        elapsed_ms = (time.perf_counter() - g.profile_start) * 1000
+        meta = {
+            'route': request.url_rule.rule if request.url_rule else None,
+            'method': request.method,
+            'path': request.path,
+            'status': g.profile_status,
+            'duration_ms': round(elapsed_ms, 3),
+            'pid': os.getpid(),
+            'timestamp': datetime.now().isoformat(),
+        }
+        profile = g.get('profile')
+        if profile is not None:
+            profile.disable()
+            meta['kind'] = 'cprofile'
+            self._write(meta, '.prof', profile.dump_stats)
+        elif self.sampler is not None and 'profile' in g:
+            stacks = self.sampler.stop(threading.get_ident())
+            if elapsed_ms >= self.slow_ms and stacks:
+                meta['kind'] = 'sampled'
+                meta['samples'] = sum(stacks.values())
+                meta['interval_ms'] = self.sampler.interval * 1000
+                text = ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+                self._write(meta, '.folded', lambda path: _write_text(path, text))
+
+    def _write(self, meta, suffix, dump):
+        route = (meta['route'] or 'sin_ruta').strip('/').replace('/', '_') or 'index'
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        base = os.path.join(self.directory, f"{stamp}_{route}_{meta['duration_ms']:.0f}ms_{meta['pid']}")
+        dump(base + suffix)
+        _write_text(base + '.json', json.dumps(meta, ensure_ascii=False, indent=2))
+        self._rotate()
+
+    def _rotate(self):
+        with self._files_lock:
+            bases = sorted({os.path.splitext(name)[0] for name in os.listdir(self.directory)})
+            for base in bases[:-self.keep] if self.keep else ():
+                for suffix in ('.prof', '.folded', '.json'):
+                    path = os.path.join(self.directory, base + suffix)
+                    if os.path.exists(path):
+                        os.remove(path)
+
+
+def _write_text(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
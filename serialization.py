@@ -0,0 +1,404 @@
+# ============================================
+# ANXIETY CHAT - FORMATOS DE LOS ARCHIVOS DE DATOS
+# ============================================
+
+import json
+import logging
+import struct
+
+try:
+    import orjson
+except ImportError:  # opcional: sin el paquete 'orjson' usa JSON compacto
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # opcional: sin el paquete se usa la versión en Python de abajo
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+
+def _json_loads(data):
+    # Cualquier JSON (con o sin sangría) se lee con el decodificador más rápido.
+    # orjson rechaza NaN/Infinity, que versiones anteriores pudieron escribir:
+    # esos archivos se leen con json y esos valores quedan en None, así el
+    # próximo flush (que ya no los admite) puede volver a escribirlos
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data, parse_constant=_drop_constant)
+
+
+def _drop_constant(name):
+    logger.warning('Valor %s no válido en JSON: se lee como null', name)
+    return None
+
+
+class Codec:
+    """Formato de users.json, sessions.json y los shards.
+
+    Además de encode/decode completos, cada formato sabe armar el objeto raíz
+    a partir de valores ya codificados (frame) y ubicar cada valor en un
+    archivo existente (spans); con eso el backend lazy reescribe el archivo
+    sin decodificar a los usuarios que no cambiaron.
+    """
+
+    name = None
+    family = None  # 'json' o 'msgpack': valores de la misma familia se copian tal cual
+    strict = False  # encode() rechaza NaN/Infinity con ValueError
+
+    def encode(self, data):
+        raise NotImplementedError
+
+    def decode(self, data):
+        raise NotImplementedError
+
+    def encode_value(self, value):
+        """Bytes de un valor del objeto raíz, tal como van dentro de frame()."""
+        return self.encode(value)
+
+    def frame(self, items, count):
+        """Arma el objeto raíz con `count` parejas (clave, valor ya codificado).
+        Devuelve (bytes, {clave: (inicio, fin) del valor})."""
+        parts = [self._begin(count)]
+        pos = len(parts[0])
+        offsets = {}
+        for n, (key, value) in enumerate(items):
+            head = self._head(key, n)
+            pos += len(head)
+            offsets[key] = (pos, pos + len(value))
+            pos += len(value)
+            parts += (head, value)
+        parts.append(self._end(count))
+        return b''.join(parts), offsets
+
+
+# ============================================
+# JSON
+# ============================================
+
+class JsonCodec(Codec):
+    """JSON con sangría de 2 espacios: el formato original, legible a mano."""
+
+    name = 'json'
+    family = 'json'
+    strict = True
+
+    # allow_nan=False: NaN e Infinity no son JSON y orjson no los leería
+
+    def encode(self, data):
+        return json.dumps(data, ensure_ascii=False, indent=2, allow_nan=False).encode('utf-8')
+
+    def decode(self, data):
+        return _json_loads(data)
+
+    def encode_value(self, value):
+        # Dentro del objeto raíz cada línea lleva 2 espacios más (igual que encode)
+        return json.dumps(value, ensure_ascii=False, indent=2, allow_nan=False).replace('\n', '\n  ').encode('utf-8')
+
+    def _begin(self, count):
+        return b'{'
+
+    def _head(self, key, n):
+        return ((',' if n else '') + '\n  ' + json.dumps(key, ensure_ascii=False) + ': ').encode('utf-8')
+
+    def _end(self, count):
+        return b'\n}' if count else b'}'
+
+    def spans(self, data):
+        """(clave, inicio, fin) en bytes de cada valor del objeto raíz."""
+        text = data.decode('utf-8')
+        ascii_only = len(text) == len(data)
+        chars = nbytes = 0
+        for key, _, start, end in json_spans(text):
+            if not ascii_only:
+                # Posiciones de caracteres → bytes, avanzando desde el valor anterior
+                nbytes += len(text[chars:start].encode('utf-8'))
+                chars, start = start, nbytes
+                nbytes += len(text[chars:end].encode('utf-8'))
+                chars, end = end, nbytes
+            yield key, start, end
+
+
+class CompactJsonCodec(JsonCodec):
+    """JSON sin espacios: ~30 % más chico que con sangría y igual de portable."""
+
+    name = 'compact'
+
+    def encode(self, data):
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'), allow_nan=False).encode('utf-8')
+
+    def encode_value(self, value):
+        return self.encode(value)
+
+    def _head(self, key, n):
+        return ((',' if n else '') + json.dumps(key, ensure_ascii=False) + ':').encode('utf-8')
+
+    def _end(self, count):
+        return b'}'
+
+
+class OrjsonCodec(CompactJsonCodec):
+    """JSON compacto escrito con orjson (en Rust)."""
+
+    name = 'orjson'
+    strict = False  # orjson escribe NaN/Infinity como null
+
+    def encode(self, data):
+        return orjson.dumps(data)
+
+
+def json_spans(text):
+    """(clave, valor, inicio, fin) de cada valor del objeto raíz; inicio y fin
+    son posiciones de caracteres en `text`."""
+    decoder = json.JSONDecoder()
+    ws = ' \t\n\r'
+    pos = text.index('{') + 1
+    while True:
+        while text[pos] in ws + ',':
+            pos += 1
+        if text[pos] == '}':
+            return
+        key, pos = decoder.raw_decode(text, pos)
+        while text[pos] in ws + ':':
+            pos += 1
+        start = pos
+        value, pos = decoder.raw_decode(text, pos)
+        yield key, value, start, pos
+
+
+# ============================================
+# MSGPACK
+# ============================================
+
+class MsgpackCodec(Codec):
+    """MessagePack binario: el más chico. Usa el paquete msgpack si está
+    instalado y, si no, la implementación en Python de este módulo (mismo
+    formato, bastante más lenta)."""
+
+    name = 'msgpack'
+    family = 'msgpack'
+
+    def encode(self, data):
+        if msgpack is not None:
+            return msgpack.packb(data, use_bin_type=True)
+        out = bytearray()
+        _pack(data, out)
+        return bytes(out)
+
+    def decode(self, data):
+        if msgpack is not None:
+            return msgpack.unpackb(data, raw=False)
+        obj, pos = _unpack(data, 0)
+        if pos != len(data):
+            raise ValueError('Datos sobrantes después del objeto msgpack')
+        return obj
+
+    def _begin(self, count):
+        out = bytearray()
+        _header(out, count, 0x80, 0xde, 0xdf, 16)
+        return bytes(out)
+
+    def _head(self, key, n):
+        out = bytearray()
+        _pack(key, out)
+        return bytes(out)
+
+    def _end(self, count):
+        return b''
+
+    def spans(self, data):
+        if _type(data, 0) != 'map':
+            raise ValueError('El objeto raíz no es un mapa msgpack')
+        count, pos = _container_size(data, 0)
+        for _ in range(count):
+            key, pos = _unpack(data, pos)
+            start = pos
+            _, pos = _unpack(data, pos)
+            yield key, start, pos
+
+
+_UINT = ((0xff, 0xcc, '>B'), (0xffff, 0xcd, '>H'), (0xffffffff, 0xce, '>I'),
+         (0xffffffffffffffff, 0xcf, '>Q'))
+_INT = ((-0x80, 0xd0, '>b'), (-0x8000, 0xd1, '>h'), (-0x80000000, 0xd2, '>i'),
+        (-0x8000000000000000, 0xd3, '>q'))
+
+
+def _header(out, n, fix, code16, code32, fix_limit):
+    if n < fix_limit:
+        out.append(fix | n)
+    elif n <= 0xffff:
+        out += struct.pack('>BH', code16, n)
+    else:
+        out += struct.pack('>BI', code32, n)
+
+
+def _pack(obj, out):
+    """Agrega obj a `out` con las mismas reglas que msgpack.packb(use_bin_type=True)."""
+    if obj is None:
+        out.append(0xc0)
+    elif obj is True:
+        out.append(0xc3)
+    elif obj is False:
+        out.append(0xc2)
+    elif isinstance(obj, int):
+        if 0 <= obj < 0x80:
+            out.append(obj)
+        elif -32 <= obj < 0:
+            out.append(obj & 0xff)
+        else:
+            for limit, code, fmt in (_UINT if obj >= 0 else _INT):
+                if (obj <= limit) if obj >= 0 else (obj >= limit):
+                    out.append(code)
+                    out += struct.pack(fmt, obj)
+                    break
+            else:
+                raise OverflowError('Entero demasiado grande para msgpack')
+    elif isinstance(obj, float):
+        out.append(0xcb)
+        out += struct.pack('>d', obj)
+    elif isinstance(obj, str):
+        raw = obj.encode('utf-8')
+        n = len(raw)
+        if n < 32:
+            out.append(0xa0 | n)
+        elif n <= 0xff:
+            out += struct.pack('>BB', 0xd9, n)
+        else:
+            _header(out, n, 0, 0xda, 0xdb, 0)
+        out += raw
+    elif isinstance(obj, (bytes, bytearray)):
+        n = len(obj)
+        if n <= 0xff:
+            out += struct.pack('>BB', 0xc4, n)
+        else:
+            _header(out, n, 0, 0xc5, 0xc6, 0)
+        out += obj
+    elif isinstance(obj, (list, tuple)):
+        _header(out, len(obj), 0x90, 0xdc, 0xdd, 16)
+        for item in obj:
+            _pack(item, out)
+    elif isinstance(obj, dict):
+        _header(out, len(obj), 0x80, 0xde, 0xdf, 16)
+        for key, value in obj.items():
+            _pack(key, out)
+            _pack(value, out)
+    else:
+        raise TypeError(f'msgpack no puede guardar {type(obj).__name__}')
+
+
+# Códigos de tamaño fijo: valor numérico directo
+_FIXED = {code: struct.Struct(fmt) for code, fmt in (
+    (0xcc, '>B'), (0xcd, '>H'), (0xce, '>I'), (0xcf, '>Q'),
+    (0xd0, '>b'), (0xd1, '>h'), (0xd2, '>i'), (0xd3, '>q'),
+    (0xca, '>f'), (0xcb, '>d'),
+)}
+# Códigos con longitud: (tipo, struct de la longitud)
+_SIZED = {code: (kind, struct.Struct(fmt)) for code, kind, fmt in (
+    (0xd9, 'str', '>B'), (0xda, 'str', '>H'), (0xdb, 'str', '>I'),
+    (0xc4, 'bin', '>B'), (0xc5, 'bin', '>H'), (0xc6, 'bin', '>I'),
+    (0xdc, 'array', '>H'), (0xdd, 'array', '>I'),
+    (0xde, 'map', '>H'), (0xdf, 'map', '>I'),
+)}
+
+
+def _type(data, pos):
+    b = data[pos]
+    if 0x80 <= b <= 0x8f:
+        return 'map'
+    if 0x90 <= b <= 0x9f:
+        return 'array'
+    return _SIZED[b][0] if b in _SIZED else None
+
+
+def _container_size(data, pos):
+    """(cantidad de elementos, posición del primero) de un array o mapa."""
+    b = data[pos]
+    if b <= 0x9f:
+        return b & 0x0f, pos + 1
+    size = _SIZED[b][1]
+    return size.unpack_from(data, pos + 1)[0], pos + 1 + size.size
+
+
+def _unpack(data, pos):
+    """(objeto, posición siguiente) a partir de data[pos]."""
+    b = data[pos]
+    pos += 1
+    if b <= 0x7f:
+        return b, pos
+    if b >= 0xe0:
+        return b - 0x100, pos
+    if 0xa0 <= b <= 0xbf:
+        end = pos + (b & 0x1f)
+        return bytes(data[pos:end]).decode('utf-8'), end
+    if b == 0xc0:
+        return None, pos
+    if b == 0xc2:
+        return False, pos
+    if b == 0xc3:
+        return True, pos
+    if b in _FIXED:
+        fixed = _FIXED[b]
+        return fixed.unpack_from(data, pos)[0], pos + fixed.size
+    if 0x80 <= b <= 0x9f:
+        kind, n = ('map' if b <= 0x8f else 'array'), b & 0x0f
+    elif b in _SIZED:
+        kind, size = _SIZED[b]
+        n = size.unpack_from(data, pos)[0]
+        pos += size.size
+    else:
+        raise ValueError(f'Tipo msgpack no soportado: 0x{b:02x}')
+    if kind == 'str':
+        return bytes(data[pos:pos + n]).decode('utf-8'), pos + n
+    if kind == 'bin':
+        return bytes(data[pos:pos + n]), pos + n
+    if kind == 'array':
+        items = []
+        for _ in range(n):
+            item, pos = _unpack(data, pos)
+            items.append(item)
+        return items, pos
+    result = {}
+    for _ in range(n):
+        key, pos = _unpack(data, pos)
+        result[key], pos = _unpack(data, pos)
+    return result, pos
+
+
+# ============================================
+# SELECCIÓN Y DETECCIÓN
+# ============================================
+
+CODECS = {
+    'json': JsonCodec(),
+    'compact': CompactJsonCodec(),
+    'orjson': OrjsonCodec(),
+    'msgpack': MsgpackCodec(),
+}
+
+
+def get_codec(name):
+    if name not in CODECS:
+        raise ValueError(f"Formato de datos desconocido: {name} (opciones: {', '.join(CODECS)})")
+    if name == 'orjson' and orjson is None:
+        logger.warning('orjson no está instalado: se usa JSON compacto')
+        name = 'compact'
+    return CODECS[name]
+
+
+def detect(data):
+    """Formato con el que leer `data`: todo JSON empieza con '{' o '[' (tras
+    espacios); el resto se lee como msgpack, cuyos mapas y arrays empiezan con
+    0x80-0x9f, 0xdc-0xdf."""
+    head = bytes(data[:64]).lstrip(b' \t\r\n')
+    if head[:1] in (b'{', b'['):
+        return CODECS['json']
+    return CODECS['msgpack']
+
+
+def decode(data):
+    """Decodifica un archivo de datos en cualquiera de los formatos."""
+    return detect(data).decode(data)
@@ -0,0 +1,406 @@
+// 👇 Esto evita que el teclado del celular tape el input
+window.addEventListener('resize', () => {
+    document.body.style.height = window.innerHeight + 'px';
+});
+
+let state = 'initial';
+let score = 0;
+let currentQ = 0;
+let responses = {};
+let generalLevel = 0;
+let hamaCompleted = false;
+
+function addBot(text) {
+    const chat = document.getElementById('chat');
+    const div = document.createElement('div');
+    div.className = 'message bot';
+    div.innerHTML = '<div class="message-content">' + text + '</div>';
+    chat.appendChild(div);
+    chat.scrollTop = chat.scrollHeight;
+}
+
+function addUser(text) {
+    const chat = document.getElementById('chat');
+    const div = document.createElement('div');
+    div.className = 'message user';
+    div.innerHTML = '<div class="message-content">' + text + '</div>';
+    chat.appendChild(div);
+    chat.scrollTop = chat.scrollHeight;
+}
+
+// Respuestas del bot por streaming (Server-Sent Events): una sola conexión
+// abierta por chat; cada evento se muestra apenas llega. Solo si el servidor
+// lo ofrece (streamEnabled); si no, cada respuesta llega completa en el JSON
+const STREAM_TIMEOUT = 5000;
+let stream = null;
+const pendingReplies = new Map();  // id → {shown, done}
+
+function openStream() {
+    if (!streamEnabled || !window.EventSource) return;
+    stream = new EventSource('/api/stream');
+    ['response', 'recommendation', 'followup'].forEach(type => {
+        stream.addEventListener(type, e => {
+            const data = JSON.parse(e.data);
+            const pending = pendingReplies.get(data.id);
+            if (pending) {
+                addBot(data.text);
+                pending.shown++;
+            }
+        });
+    });
+    stream.addEventListener('done', e => {
+        const pending = pendingReplies.get(JSON.parse(e.data).id);
+        if (pending) pending.done();
+    });
+}
+
+// Textos de la respuesta en el mismo orden que los eventos del stream
+function replyTexts(data) {
+    const texts = [];
+    if (data.responses && data.responses.length > 0) {
+        texts.push(data.responses[0].message);
+        if (data.responses[0].recommendation) texts.push(data.responses[0].recommendation);
+    }
+    return texts.concat(data.follow_ups || []);
+}
+
+async function askBot(msg, context) {
+    const id = Date.now().toString(36) + Math.random().toString(36).slice(2);
+    const pending = {shown: 0};
+    const done = new Promise(resolve => pending.done = resolve);
+    if (stream) pendingReplies.set(id, pending);
+    const res = await fetch('/api/message', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({message: msg, context: context, id: id})
+    });
+    const data = await res.json();
+    let delivered = false;
+    if (data.streamed) {
+        // Si 'done' no llega (stream caído), lo que falte se muestra desde el JSON
+        const timeout = new Promise(resolve => setTimeout(() => resolve(false), STREAM_TIMEOUT));
+        delivered = await Promise.race([done.then(() => true), timeout]);
+    }
+    pendingReplies.delete(id);
+    if (!delivered) replyTexts(data).slice(pending.shown).forEach(text => addBot(text));
+}
+
+function welcome() {
+    addBot("👋 ¡Hola! Soy Anxiety Chat, tu asistente de bienestar emocional.");
+    setTimeout(() => addBot("💡 Estoy aquí para ayudarte a reconocer cómo te has sentido y acompañarte en la identificación de síntomas de ansiedad."), 1000);
+    setTimeout(() => addBot("Esto no reemplaza la valoración profesional, pero puede orientarte."), 2000);
+    setTimeout(() => addBot("🔒 Todas tus respuestas son confidenciales y anónimas."), 3000);
+    setTimeout(() => addBot("¿Quieres comenzar? Escribe 'sí' para empezar."), 4000);
+}
+
+async function send() {
+    const input = document.getElementById('input');
+    const msg = input.value.trim();
+    if (!msg) return;
+
+    addUser(msg);
+    input.value = '';
+
+    await process(msg);
+}
+
+async function process(msg) {
+    const lower = msg.toLowerCase();
+
+    if ((lower.includes('gracias') || lower.includes('muchas gracias')) && state !== 'initial' && state !== 'finished') {
+        setTimeout(() => {
+            addBot("¡De nada! Ha sido un gusto poder ayudarte 😊");
+            setTimeout(() => addBot("Espero que te sientas mejor después de nuestra conversación."), 1500);
+            setTimeout(() => addBot("Recuerda que pedir ayuda es valentía 💚"), 3000);
+            setTimeout(() => addBot("¿Te gustaría iniciar una nueva conversación o terminamos aquí?"), 4500);
+            state = 'finished';
+        }, 500);
+        return;
+    }
+
+    if (state === 'initial') {
+        if (lower.includes('si') || lower.includes('sí') || lower.includes('comenzemos') || lower.includes('quiero') || lower.includes('comenzar') || lower.includes('iniciar')) {
+            setTimeout(() => {
+                addBot("¡Perfecto! Cuéntame: ¿cómo te has sentido en los últimos días?");
+                state = 'conversation';
+            }, 500);
+        } else if (lower.includes('no')) {
+            setTimeout(() => {
+                addBot("Está bien. Cuando quieras hablar, estaré aquí.");
+                state = 'conversation';
+            }, 500);
+        } else {
+            setTimeout(() => addBot("¿Te gustaría comenzar? Escribe 'sí' cuando estés listo(a)."), 500);
+        }
+    } else if (state === 'conversation') {
+        state = 'ask_hama';
+        await askBot(msg, 'conversation');
+    } else if (state === 'ask_hama') {
+        if (lower.includes('si') || lower.includes('sí') || lower.includes('quiero')) {
+            startHama();
+        } else {
+            setTimeout(() => {
+                addBot("¿Hay algo más que quieras compartir?");
+                state = 'final';
+            }, 500);
+        }
+    } else if (state === 'hama') {
+        const val = parseInt(msg);
+        if (isNaN(val) || val < 0 || val > 4) {
+            setTimeout(() => addBot("⚠️ Ingresa un número entre 0 y 4."), 500);
+            return;
+        }
+        score += val;
+        responses[questions[currentQ].id] = val;
+        setTimeout(() => addBot("✓ Registrado"), 300);
+        currentQ++;
+        if (currentQ < questions.length) {
+            setTimeout(() => nextQ(), 800);
+        } else {
+            setTimeout(() => observation(), 1000);
+        }
+    } else if (state === 'general') {
+        const val = parseInt(msg);
+        if (isNaN(val) || val < 0 || val > 10) {
+            setTimeout(() => addBot("⚠️ Ingresa un número entre 0 y 10."), 500);
+            return;
+        }
+        generalLevel = val;
+        setTimeout(() => {
+            addBot("✓ Gracias.");
+            setTimeout(() => {
+                addBot("¿Tienes algún otro síntoma o pregunta antes de finalizar?");
+                state = 'final';
+            }, 1500);
+        }, 500);
+    } else if (state === 'final') {
+        if (lower.includes('no') || lower.includes('terminamos')|| lower.includes('terminar') || lower.includes('listo')) {
+            if (!hamaCompleted) {
+                setTimeout(() => {
+                    addBot("Antes de terminar, me gustaría recordarte que tenemos un cuestionario de evaluación (HAM-A) que puede ayudarte a entender mejor tu nivel de ansiedad.");
+                    setTimeout(() => addBot("¿Te gustaría hacer el cuestionario antes de finalizar? Es rápido, solo 12 preguntas."), 2000);
+                    state = 'ask_hama_final';
+                }, 500);
+            } else {
+                conclusion();
+            }
+        } else {
+            await askBot(msg, 'final');
+        }
+    } else if (state === 'finished') {
+        if (lower.includes('si') || lower.includes('sí') || lower.includes('nuevo') || lower.includes('nueva conversacion')) {
+            state = 'initial';
+            score = 0;
+            currentQ = 0;
+            responses = {};
+            generalLevel = 0;
+            hamaCompleted = false;
+            document.getElementById('chat').innerHTML = '';
+            setTimeout(() => {
+                addBot("¡Perfecto! Comenzamos de nuevo 🔄");
+                setTimeout(() => welcome(), 1000);
+            }, 500);
+        } else if (lower.includes('historial') || lower.includes('historia') || lower.includes('sesiones') || lower.includes('ver historial') || lower.includes('ver historia')) {
+            showHistory();
+            setTimeout(() => addBot("¿Quieres iniciar una nueva conversación?"), 2000);
+        } else if (lower.includes('no')) {
+            setTimeout(() => addBot("Entiendo. Siempre estaré aquí cuando me necesites. Cuídate mucho 💙"), 500);
+        } else {
+            setTimeout(() => addBot("¿Quieres iniciar una nueva conversación o no?"), 500);
+        }
+    } else if (state === 'ask_hama_final') {
+        if (lower.includes('si') || lower.includes('sí') || lower.includes('quiero') || lower.includes('si quiero')|| lower.includes('iniciar una nueva conversacion')|| lower.includes('iniciar') || lower.includes('iniciar otra')) {
+            startHama();
+        } else {
+            setTimeout(() => addBot("Entiendo. Entonces finalizamos sin el cuestionario."), 500);
+            setTimeout(() => conclusionWithoutHama(), 1500);
+        }
+    }
+}
+
+function startHama() {
+    state = 'hama';
+    currentQ = 0;
+    hamaCompleted = false;
+    setTimeout(() => {
+        addBot("Perfecto. Voy a hacerte 12 preguntas. Responde con un número:");
+        setTimeout(() => addBot("0 = Ninguno | 1 = Leve | 2 = Moderado | 3 = Severo | 4 = Muy severo"), 1000);
+        setTimeout(() => nextQ(), 2000);
+    }, 500);
+}
+
+function nextQ() {
+    const q = questions[currentQ];
+    addBot(`Pregunta ${currentQ + 1}/12: ${q.text}`);
+    setTimeout(() => addBot("Responde: 0, 1, 2, 3 o 4"), 500);
+}
+
+function observation() {
+    hamaCompleted = true;
+    addBot("📊 He estado analizando tus respuestas para reconocer señales de ansiedad.");
+    setTimeout(() => {
+        addBot("Última pregunta: En escala del 0 al 10, ¿cómo calificarías tu nivel de ansiedad general en los últimos días?");
+        state = 'general';
+    }, 2000);
+}
+
+async function conclusionWithoutHama() {
+    setTimeout(() => addBot("Gracias por compartir conmigo 💬."), 500);
+    setTimeout(() => addBot("Aunque no hicimos el cuestionario, espero que nuestra conversación te haya sido útil."), 1500);
+    setTimeout(() => addBot("🌿 Te recomiendo respirar profundo, descansar y si los síntomas persisten, buscar orientación profesional."), 3000);
+    setTimeout(() => addBot("Recuerda: pedir ayuda es autocuidado y fortaleza 💙"), 4500);
+    setTimeout(() => {
+        addBot("¿Te gustaría ver tu historial de conversaciones o iniciar una nueva conversación?");
+        state = 'finished';
+    }, 6000);
+}
+
+async function conclusion() {
+    setTimeout(() => addBot("📊 Procesando..."), 500);
+    setTimeout(() => addBot(`Tu puntuación HAM-A: ${score}/48 puntos`), 1500);
+
+    setTimeout(() => {
+        if (score < 18) {
+            addBot("🌿 Tu nivel de ansiedad está en rango leve o controlado. Aun así, cuida tu bienestar mental.");
+            setTimeout(() => addBot("Te recomiendo: descansar 7-8 horas, hacer ejercicio, hablar con alguien de confianza."), 2000);
+            setTimeout(() => addBot("Si tu ansiedad aumenta, buscar ayuda profesional siempre es buena decisión 💚."), 4000);
+        } else {
+            addBot("⚠️ Tus respuestas indican un nivel elevado de ansiedad.");
+            setTimeout(() => addBot("Te recomiendo hablar con un profesional de salud mental para recibir apoyo personalizado."), 2000);
+            setTimeout(() => addBot("No estás solo(a). Pedir ayuda no es debilidad, es un paso valiente 💚."), 4000);
+            setTimeout(() => addBot("📞 Universidad: bienestar@curnvirtual.edu.co | Línea 24/7: 01 8000 1119"), 6000);
+        }
+    }, 2500);
+
+    setTimeout(() => addBot("Gracias por compartir cómo te has sentido 💬."), score < 18 ? 6500 : 8500);
+    setTimeout(() => addBot("🌿 Te recomiendo respirar profundo, descansar y buscar orientación si los síntomas persisten."), score < 18 ? 8000 : 10000);
+    setTimeout(() => addBot("Recuerda: pedir ayuda es autocuidado y fortaleza 💙"), score < 18 ? 9500 : 11500);
+
+    await fetch('/api/save', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({score, responses, generalLevel})
+    });
+
+    setTimeout(() => {
+        addBot("¿Te gustaría iniciar una nueva conversación o terminamos aquí?");
+        state = 'finished';
+    }, score < 18 ? 11000 : 13000);
+}
+
+const HISTORY_PAGE = 10;
+let historyCursor = null;
+let historyShown = 0;
+let historyTotal = 0;
+
+async function showHistory() {
+    const panel = document.getElementById('historyPanel');
+    const content = document.getElementById('historyContent');
+
+    panel.classList.add('open');
+    content.innerHTML = '<div class="no-sessions">Cargando historial...</div>';
+
+    historyCursor = null;
+    historyShown = 0;
+    const data = await fetchHistoryPage();
+
+    if (data.sessions && data.sessions.length > 0) {
+        content.innerHTML = '';
+        renderHistoryPage(data);
+    } else {
+        content.innerHTML = `
+            <div class="no-sessions">
+                <p style="font-size:18px;margin-bottom:10px;">📚</p>
+                <p>Aún no tienes sesiones registradas</p>
+                <p style="font-size:13px;margin-top:10px;color:#999;">Completa el cuestionario HAM-A para guardar tu primera sesión</p>
+            </div>
+        `;
+    }
+}
+
+async function fetchHistoryPage() {
+    // Solo los campos que se muestran, de la sesión más reciente a la más antigua
+    let url = `/api/history?limit=${HISTORY_PAGE}&fields=timestamp,score,general_level`;
+    if (historyCursor) url += `&cursor=${encodeURIComponent(historyCursor)}`;
+    const res = await fetch(url);
+    const data = await res.json();
+    historyCursor = data.next_cursor;
+    historyTotal = data.total;
+    return data;
+}
+
+async function loadMoreHistory(button) {
+    button.disabled = true;
+    button.textContent = 'Cargando...';
+    const data = await fetchHistoryPage();
+    button.remove();
+    renderHistoryPage(data);
+}
+
+function renderHistoryPage(data) {
+    const content = document.getElementById('historyContent');
+    let html = '';
+
+    data.sessions.forEach(s => {
+        const number = historyTotal - historyShown;
+        historyShown++;
+        const date = new Date(s.timestamp).toLocaleString('es-CO', {
+            year: 'numeric',
+            month: 'long',
+            day: 'numeric',
+            hour: '2-digit',
+            minute: '2-digit'
+        });
+
+        if (s.score !== undefined && s.score !== null) {
+            let levelClass = '';
+            let levelText = '';
+
+            if (s.score < 18) {
+                levelClass = 'level-low';
+                levelText = '🟢 Ansiedad leve/controlada';
+            } else if (s.score < 25) {
+                levelClass = 'level-moderate';
+                levelText = '🟡 Ansiedad moderada';
+            } else {
+                levelClass = 'level-high';
+                levelText = '🔴 Ansiedad elevada';
+            }
+
+            html += `
+                <div class="session-card">
+                    <h3>Sesión ${number}</h3>
+                    <div class="session-date">📅 ${date}</div>
+                    <div class="session-score">📊 Puntuación HAM-A: ${s.score}/48</div>
+                    <div class="session-level ${levelClass}">${levelText}</div>
+                    ${s.general_level !== undefined && s.general_level !== null ? `<div style="margin-top:10px;color:#666;font-size:14px;">📈 Nivel autoevaluado: ${s.general_level}/10</div>` : ''}
+                </div>
+            `;
+        } else {
+            html += `
+                <div class="session-card" style="border-left-color: #ccc;">
+                    <h3>Sesión ${number}</h3>
+                    <div class="session-date">📅 ${date}</div>
+                    <div style="color:#999;font-style:italic;margin-top:10px;">
+                        ⚠️ No completó el cuestionario HAM-A
+                    </div>
+                </div>
+            `;
+        }
+    });
+
+    if (historyCursor) {
+        html += `<button class="load-more" onclick="loadMoreHistory(this)">Cargar sesiones anteriores (${historyTotal - historyShown})</button>`;
+    }
+
+    content.insertAdjacentHTML('beforeend', html);
+}
+
+function closeHistory() {
+    document.getElementById('historyPanel').classList.remove('open');
+}
+
+window.onload = () => {
+    openStream();
+    welcome();
+};
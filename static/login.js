@@ -0,0 +1,80 @@
+function showRegister() {
+    document.getElementById('loginForm').style.display = 'none';
+    document.getElementById('registerForm').style.display = 'block';
+    document.getElementById('error').textContent = '';
+}
+
+function showLogin() {
+    document.getElementById('loginForm').style.display = 'block';
+    document.getElementById('registerForm').style.display = 'none';
+    document.getElementById('error').textContent = '';
+}
+
+// Con muchos inicios de sesión a la vez el servidor responde 503 y Retry-After:
+// se espera lo indicado y se reintenta unas pocas veces
+const MAX_RETRIES = 5;
+
+async function postJSON(url, body) {
+    for (let attempt = 0; ; attempt++) {
+        const res = await fetch(url, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify(body)
+        });
+        if (res.status !== 503 || attempt >= MAX_RETRIES) return res.json();
+        const wait = parseInt(res.headers.get('Retry-After') || '2', 10);
+        document.getElementById('error').textContent = `Servidor ocupado, reintentando en ${wait} s...`;
+        await new Promise(resolve => setTimeout(resolve, wait * 1000));
+    }
+}
+
+async function login() {
+    const user = document.getElementById('loginUser').value.trim();
+    const pass = document.getElementById('loginPass').value;
+
+    if (!user || !pass) {
+        document.getElementById('error').textContent = 'Completa todos los campos';
+        return;
+    }
+
+    const data = await postJSON('/login', {username: user, password: pass});
+    if (data.success) {
+        window.location.href = '/chat';
+    } else {
+        document.getElementById('error').textContent = data.message;
+    }
+}
+
+async function register() {
+    const user = document.getElementById('regUser').value.trim();
+    const pass = document.getElementById('regPass').value;
+    const confirm = document.getElementById('regConfirm').value;
+
+    if (!user || !pass || !confirm) {
+        document.getElementById('error').textContent = 'Completa todos los campos';
+        return;
+    }
+
+    if (pass !== confirm) {
+        document.getElementById('error').textContent = 'Las contraseñas no coinciden';
+        return;
+    }
+
+    const data = await postJSON('/register', {username: user, password: pass});
+    if (data.success) {
+        alert('¡Registro exitoso! Ahora inicia sesión');
+        showLogin();
+    } else {
+        document.getElementById('error').textContent = data.message;
+    }
+}
+
+document.addEventListener('keypress', (e) => {
+    if (e.key === 'Enter') {
+        if (document.getElementById('loginForm').style.display !== 'none') {
+            login();
+        } else {
+            register();
+        }
+    }
+});
@@ -0,0 +1,128 @@
+# ============================================
+# ANXIETY CHAT - ESTADÍSTICAS HAM-A POR USUARIO
+# ============================================
+
+import math
+from datetime import datetime
+
+# Bandas de la puntuación HAM-A (las mismas del historial en el chat)
+BANDS = ('leve', 'moderada', 'elevada')
+
+
+def band(score):
+    if score < 18:
+        return 'leve'
+    if score < 25:
+        return 'moderada'
+    return 'elevada'
+
+
+def new_stats():
+    return {
+        'sessions': 0,           # sesiones guardadas, completas o no
+        'scored': 0,             # sesiones con puntuación
+        'score_sum': 0,
+        'latest_score': None,
+        'latest_timestamp': None,
+        'band_seconds': {name: 0.0 for name in BANDS},
+        'item_sums': {},         # id de pregunta → suma de respuestas
+        'item_counts': {},
+    }
+
+
+def is_score(value):
+    """Número finito: NaN o infinito dejarían los agregados así para siempre."""
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def valid_stats(stats):
+    """False si los agregados guardados no sirven (NaN/infinito de versiones
+    anteriores, o null al leerlos de nuevo) y hay que recalcularlos."""
+    return (isinstance(stats, dict) and is_score(stats.get('score_sum'))
+            and all(is_score(value) for value in stats.get('item_sums', {}).values()))
+
+
+def update_stats(stats, entry):
+    """Suma una sesión HAM-A a los agregados en tiempo constante.
+
+    El tiempo entre una sesión puntuada y la siguiente cuenta para la banda de
+    la primera; el tramo desde la última hasta hoy se suma al consultar.
+    """
+    stats['sessions'] += 1
+    score = entry.get('score')
+    if not is_score(score):
+        return stats
+    timestamp = entry['timestamp']
+    if stats['latest_timestamp'] is not None:
+        elapsed = (datetime.fromisoformat(timestamp)
+                   - datetime.fromisoformat(stats['latest_timestamp'])).total_seconds()
+        stats['band_seconds'][band(stats['latest_score'])] += max(elapsed, 0.0)
+    stats['scored'] += 1
+    stats['score_sum'] += score
+    stats['latest_score'] = score
+    stats['latest_timestamp'] = timestamp
+    responses = entry.get('responses')
+    if not isinstance(responses, dict):
+        return stats
+    for item, value in responses.items():
+        if is_score(value):
+            stats['item_sums'][item] = stats['item_sums'].get(item, 0) + value
+            stats['item_counts'][item] = stats['item_counts'].get(item, 0) + 1
+    return stats
+
+
+def compute_stats(sessions):
+    """Agregados desde cero a partir del historial completo."""
+    stats = new_stats()
+    for entry in sessions:
+        update_stats(stats, entry)
+    return stats
+
+
+def copy_stats(stats):
+    return {**stats,
+            'band_seconds': dict(stats['band_seconds']),
+            'item_sums': dict(stats['item_sums']),
+            'item_counts': dict(stats['item_counts'])}
+
+
+def record_session(user, entry):
+    """Agrega una sesión a user['sessions'] y a user['stats']. Los agregados se
+    calculan antes de tocar el usuario: si fallan, queda como estaba."""
+    if valid_stats(user.get('stats')):
+        stats = update_stats(copy_stats(user['stats']), entry)
+    else:
+        # Usuario anterior a las estadísticas: se calculan una vez con todo
+        stats = compute_stats(user['sessions'] + [entry])
+    user['sessions'].append(entry)
+    user['stats'] = stats
+
+
+def user_stats(user):
+    """Agregados del usuario, o None si hay que calcularlos con compute_stats
+    (el store los guarda en user['stats'] con su candado)."""
+    stats = user.get('stats')
+    return stats if valid_stats(stats) else None
+
+
+def summarize(stats, now=None):
+    """Vista para /api/stats: promedios y tiempo por banda hasta `now`."""
+    now = now or datetime.now()
+    band_seconds = dict(stats['band_seconds'])
+    latest_band = None
+    if stats['latest_timestamp'] is not None:
+        latest_band = band(stats['latest_score'])
+        elapsed = (now - datetime.fromisoformat(stats['latest_timestamp'])).total_seconds()
+        band_seconds[latest_band] += max(elapsed, 0.0)
+    return {
+        'sessions': stats['sessions'],
+        'scored_sessions': stats['scored'],
+        'mean_score': stats['score_sum'] / stats['scored'] if stats['scored'] else None,
+        'latest_score': stats['latest_score'],
+        'latest_timestamp': stats['latest_timestamp'],
+        'latest_band': latest_band,
+        'time_in_band_seconds': band_seconds,
+        # Orden natural de los ids: '2' antes que '10'
+        'item_means': {item: stats['item_sums'][item] / stats['item_counts'][item]
+                       for item in sorted(stats['item_counts'], key=lambda item: (len(item), item))},
+    }
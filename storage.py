@@ -0,0 +1,1041 @@
+# ============================================
+# ANXIETY CHAT - ALMACENAMIENTO
+# ============================================
+
+import bisect
+import hashlib
+import json
+import logging
+import mmap
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from serialization import CODECS, decode, detect, get_codec, json_spans
+from stats import compute_stats, record_session, update_stats, user_stats, valid_stats
+
+logger = logging.getLogger(__name__)
+
+
+def load_json(filename):
+    """Carga un archivo de datos; el formato (JSON o msgpack) se detecta solo."""
+    if os.path.exists(filename):
+        with open(filename, 'rb') as f:
+            return decode(f.read())
+    return {}
+
+def write_file(filename, text, fsync=False):
+    """Escritura atómica: se escribe un temporal en la misma carpeta y se
+    renombra encima, así una caída nunca deja el archivo a medias. `text`
+    puede ser str o bytes ya codificados en UTF-8.
+
+    El temporal siempre pasa por fsync antes del renombre (si no, una caída
+    puede dejar el archivo nuevo vacío); `fsync` solo decide si además se
+    sincroniza la carpeta para que el renombre mismo sea durable."""
+    folder = os.path.dirname(os.path.abspath(filename))
+    fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(filename) + '.',
+                               suffix='.tmp', dir=folder)
+    try:
+        with os.fdopen(fd, 'wb' if isinstance(text, bytes) else 'w',
+                       encoding=None if isinstance(text, bytes) else 'utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(filename):
+            shutil.copymode(filename, tmp)
+        os.replace(tmp, filename)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    if fsync:
+        fsync_dir(folder)
+
+def fsync_dir(folder):
+    """fsync de la carpeta para que los renombres en ella también sean durables."""
+    if os.name != 'posix':
+        return
+    dir_fd = os.open(folder, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+def fsync_path(filename):
+    """fsync de un archivo ya escrito y de su carpeta."""
+    fd = os.open(filename, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    fsync_dir(os.path.dirname(os.path.abspath(filename)))
+
+def save_json(filename, data, fsync=False, codec=None):
+    """Guarda con el formato `codec` (por defecto, JSON con sangría)."""
+    write_file(filename, (codec or CODECS['json']).encode(data), fsync)
+
+def history_version(user):
+    """(cantidad de sesiones HAM-A, fecha de la última escritura) de un registro de usuario."""
+    sessions = user.get('sessions', [])
+    return len(sessions), sessions[-1]['timestamp'] if sessions else user.get('created_at')
+
+def page_sessions(sessions, since=None, until=None, before=None, limit=20):
+    """Página de sesiones de la más reciente a la más antigua.
+
+    Las sesiones se agregan en orden cronológico, así que los filtros de fecha
+    (since <= timestamp < until, en ISO) se resuelven con búsqueda binaria y
+    solo se copia la porción pedida. `before` es la posición devuelta como
+    siguiente cursor por la página anterior. Devuelve (página, siguiente
+    cursor o None, total de sesiones dentro de las fechas).
+    """
+    lo = bisect.bisect_left(sessions, since, key=_timestamp) if since else 0
+    hi = bisect.bisect_left(sessions, until, key=_timestamp) if until else len(sessions)
+    end = hi if before is None else max(lo, min(hi, before))
+    start = max(lo, end - limit)
+    return sessions[start:end][::-1], (start if start > lo else None), max(hi - lo, 0)
+
+def _timestamp(entry):
+    return entry['timestamp']
+
+def iter_json_items(filename):
+    """Recorre las parejas (clave, valor) del objeto raíz de un archivo de
+    datos una a una, sin construir el diccionario completo."""
+    if not os.path.exists(filename):
+        return
+    with open(filename, 'rb') as f:
+        data = f.read()
+    codec = detect(data)
+    if codec.family == 'json':
+        for key, value, _, _ in json_spans(data.decode('utf-8')):
+            yield key, value
+    else:
+        for key, start, end in codec.spans(data):
+            yield key, codec.decode(data[start:end])
+
+
+# ============================================
+# ESCRITURA DIFERIDA (WRITE-BEHIND)
+# ============================================
+
+# Política de durabilidad: 'always' hace fsync en cada escritura, 'batched'
+# como máximo una vez por FSYNC_INTERVAL segundos y 'never' lo deja al sistema.
+# Los archivos reescritos con write_file() siempre sincronizan su contenido
+# antes del renombre; la política decide la carpeta y la bitácora
+FSYNC_POLICIES = ('always', 'batched', 'never')
+FSYNC_INTERVAL = 1.0
+
+
+class WriteBehind:
+    """Hilo que agrupa los cambios pendientes de un store y los escribe juntos
+    cada `interval` segundos o al acumular `max_changes` cambios."""
+
+    def __init__(self, store, interval=0.2, max_changes=100):
+        self.store = store
+        self.interval = interval
+        self.max_changes = max_changes
+        self._pending = 0
+        self._stopping = False
+        self._cond = threading.Condition()
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+
+    def _start(self):
+        # Se arranca con el primer cambio: con gunicorn --preload el store se
+        # crea en el proceso maestro y cada worker necesita su propio hilo
+        # (con candado: dos peticiones a la vez no deben arrancar dos hilos ni
+        # cambiar self._cond mientras el primero la usa)
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    self._cond = threading.Condition()
+                    self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                    self._thread.start()
+                    self._pid = os.getpid()
+
+    def notify(self):
+        self._start()
+        with self._cond:
+            self._pending += 1
+            if self._pending >= self.max_changes:
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stopping and self._pending < self.max_changes:
+                    self._cond.wait(self.interval)
+                stopping = self._stopping
+                self._pending = 0
+            try:
+                self.store.flush()
+            except Exception:
+                logger.exception('Error al escribir los cambios pendientes')
+            if stopping:
+                return
+
+    def stop(self):
+        """Detiene el hilo después de un último flush."""
+        if self._pid != os.getpid():
+            # Sin cambios en este proceso no hay hilo; close() hace el flush
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join()
+
+
+class BaseStore:
+    """Base de los stores en archivos: los datos viven en memoria y cada cambio
+    queda pendiente hasta flush(), inmediato o a cargo de WriteBehind.
+
+    Cada usuario tiene su propio candado (user_lock) para las operaciones que
+    leen y luego modifican sus datos; self._lock solo protege por un instante
+    los diccionarios compartidos y la foto que se serializa en flush().
+    """
+
+    def __init__(self, fsync='never', codec='json'):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Política de fsync desconocida: {fsync}")
+        self.fsync = fsync
+        self.codec = get_codec(codec)
+        self.writer = None
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._locks_guard = threading.Lock()
+        self._user_locks = {}
+        self._last_fsync = 0.0
+        # Con 'batched', archivos escritos desde el último fsync
+        self._unsynced = set()
+        self._sync_timer = None
+
+    def user_lock(self, username):
+        with self._locks_guard:
+            lock = self._user_locks.get(username)
+            if lock is None:
+                lock = self._user_locks[username] = threading.RLock()
+            return lock
+
+    def start_write_behind(self, interval=0.2, max_changes=100):
+        self.writer = WriteBehind(self, interval, max_changes)
+
+    def _check(self, *items):
+        """Rechaza lo que no se podría serializar antes de tocar la memoria: un
+        cambio así dejaría fallando todos los flush siguientes."""
+        for item in items:
+            try:
+                self.codec.encode(item)
+                if not self.codec.strict:
+                    # La bitácora y los archivos JSON no admiten NaN/Infinity
+                    CODECS['compact'].encode(item)
+            except (TypeError, ValueError, OverflowError) as e:
+                raise ValueError(f'Dato que no se puede guardar: {e}') from e
+
+    def _user_stats(self, user):
+        stats = user_stats(user)
+        if stats is None:
+            # Usuario anterior a las estadísticas: se calculan una vez con todo.
+            # Con self._lock: flush() puede estar serializando este usuario
+            stats = compute_stats(user.get('sessions', []))
+            with self._lock:
+                user['stats'] = stats
+        return stats
+
+    def _persist(self):
+        if self.writer is not None:
+            self.writer.notify()
+        else:
+            self.flush()
+
+    def _fsync_due(self):
+        if self.fsync == 'always':
+            return True
+        if self.fsync == 'batched' and time.monotonic() - self._last_fsync >= FSYNC_INTERVAL:
+            self._last_fsync = time.monotonic()
+            return True
+        return False
+
+    def flush(self):
+        # _flush_lock mantiene el orden: una foto vieja nunca pisa a una nueva
+        with self._flush_lock:
+            with self._lock:
+                pending = self._take_pending()
+            fsync = self._fsync_due()
+            if pending:
+                self._write_pending(pending, fsync)
+                if not fsync and self.fsync == 'batched':
+                    self._unsynced.update(self._pending_files(pending))
+            if fsync:
+                self._sync_unsynced()
+            elif self._unsynced:
+                self._schedule_sync()
+
+    def _take_pending(self):
+        """Serializa los cambios pendientes (con self._lock tomado)."""
+        raise NotImplementedError
+
+    def _write_pending(self, pending, fsync):
+        for filename, text in pending:
+            write_file(filename, text, fsync)
+
+    def _pending_files(self, pending):
+        """Archivos que toca _write_pending(pending)."""
+        return [filename for filename, _ in pending]
+
+    def _sync_unsynced(self):
+        # Con _flush_lock tomado
+        for filename in sorted(self._unsynced):
+            fsync_path(filename)
+        self._unsynced.clear()
+
+    def _schedule_sync(self):
+        # Si no llega otra escritura, lo escrito sin fsync se sincroniza igual
+        # en el siguiente intervalo
+        if self._sync_timer is None or not self._sync_timer.is_alive():
+            self._sync_timer = threading.Timer(FSYNC_INTERVAL, self._sync_later)
+            self._sync_timer.daemon = True
+            self._sync_timer.start()
+
+    def _sync_later(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Error al sincronizar los cambios pendientes')
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.stop()
+            self.writer = None
+        self.flush()
+        if self._sync_timer is not None:
+            self._sync_timer.cancel()
+        with self._flush_lock:
+            self._sync_unsynced()
+
+
+class JsonStore(BaseStore):
+    """Modo original: users.json y sessions.json se reescriben completos en cada cambio."""
+
+    def __init__(self, users_file='users.json', sessions_file='sessions.json', fsync='never',
+                 codec='json'):
+        super().__init__(fsync, codec)
+        self.users_file = users_file
+        self.sessions_file = sessions_file
+        self.users_db = self._open(users_file)
+        self.sessions_db = self._open(sessions_file)
+        self._dirty = set()
+
+    def _open(self, filename):
+        return load_json(filename)
+
+    def get_user(self, username):
+        return self.users_db.get(username)
+
+    def get_sessions(self, username):
+        return self.users_db[username].get('sessions', [])
+
+    def get_sessions_page(self, username, since=None, until=None, before=None, limit=20):
+        return page_sessions(self.get_sessions(username), since, until, before, limit)
+
+    def get_chats(self, username, limit=20):
+        """Últimos `limit` mensajes del chat, en orden cronológico."""
+        with self.user_lock(username):
+            return list(self.sessions_db.get(username, [])[-limit:])
+
+    def history_version(self, username):
+        return history_version(self.users_db[username])
+
+    def create_user(self, username, record):
+        """Crea el usuario; devuelve False si otro hilo lo creó primero."""
+        self._check(record)
+        with self.user_lock(username):
+            if username in self.users_db:
+                return False
+            with self._lock:
+                self.users_db[username] = record
+                self._dirty.add(self.users_file)
+        self._persist()
+        return True
+
+    def add_chat(self, username, entry):
+        self.add_chats(username, [entry])
+
+    def add_chats(self, username, entries):
+        self._check(*entries)
+        with self.user_lock(username), self._lock:
+            self.sessions_db.setdefault(username, []).extend(entries)
+            self._dirty.add(self.sessions_file)
+        self._persist()
+
+    def add_session(self, username, entry):
+        self._check(entry)
+        with self.user_lock(username), self._lock:
+            record_session(self.users_db[username], entry)
+            self._dirty.add(self.users_file)
+        self._persist()
+
+    def get_stats(self, username):
+        with self.user_lock(username):
+            return self._user_stats(self.users_db[username])
+
+    def sizes(self):
+        """Cantidad de usuarios y de usuarios con mensajes guardados."""
+        return len(self.users_db), len(self.sessions_db)
+
+    def _take_pending(self):
+        files = {self.users_file: self.users_db, self.sessions_file: self.sessions_db}
+        pending = [(filename, self.codec.encode(files[filename])) for filename in self._dirty]
+        self._dirty.clear()
+        return pending
+
+
+class JournalStore(JsonStore):
+    """Bitácora append-only (JSONL): cada evento agrega una línea al final.
+
+    Al iniciar se cargan users.json/sessions.json como punto de partida y se
+    reproducen encima los eventos de la bitácora. compact() vuelca el estado a
+    los JSON y vacía la bitácora; con max_bytes se llama sola cuando la
+    bitácora pasa de ese tamaño.
+    """
+
+    def __init__(self, users_file='users.json', sessions_file='sessions.json',
+                 journal_file='journal.jsonl', fsync='never', codec='json', max_bytes=0):
+        self.journal_file = journal_file
+        self.max_bytes = max_bytes
+        # Marca de una compactación ya decidida (ver compact())
+        self._marker = journal_file + '.compact'
+        self._finish_compaction(users_file, sessions_file)
+        super().__init__(users_file, sessions_file, fsync, codec)
+        self._lines = []
+        self._replay()
+        self._journal = open(journal_file, 'a', encoding='utf-8')
+
+    def _replay(self):
+        if not os.path.exists(self.journal_file):
+            return
+        with open(self.journal_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Línea incompleta por una caída a mitad de escritura
+                    continue
+                self._apply(record)
+
+    def _apply(self, record):
+        op, username, data = record['op'], record['user'], record['data']
+        if op == 'register':
+            self.users_db[username] = data
+        elif op == 'analyze':
+            self.sessions_db.setdefault(username, []).append(data)
+        elif op == 'save':
+            record_session(self.users_db[username], data)
+
+    def _append(self, op, username, *items):
+        self._check(*items)
+        records = [{'op': op, 'user': username, 'data': data} for data in items]
+        # Un solo candado para que el orden de la bitácora sea el de memoria
+        with self._lock:
+            for record in records:
+                self._apply(record)
+                self._lines.append(json.dumps(record, ensure_ascii=False, separators=(',', ':'),
+                                              allow_nan=False))
+        self._persist()
+
+    def create_user(self, username, record):
+        with self.user_lock(username):
+            if username in self.users_db:
+                return False
+            self._append('register', username, record)
+        return True
+
+    def add_chats(self, username, entries):
+        self._append('analyze', username, *entries)
+
+    def add_session(self, username, entry):
+        self._append('save', username, entry)
+
+    def _take_pending(self):
+        lines, self._lines = self._lines, []
+        return ''.join(line + '\n' for line in lines)
+
+    def _write_pending(self, pending, fsync):
+        self._journal.write(pending)
+        self._journal.flush()
+        if fsync:
+            os.fsync(self._journal.fileno())
+
+    def _pending_files(self, pending):
+        return [self.journal_file]
+
+    def flush(self):
+        super().flush()
+        if self.max_bytes and os.fstat(self._journal.fileno()).st_size >= self.max_bytes:
+            self.compact()
+
+    def compact(self):
+        """Vuelca el estado actual a los JSON y empieza una bitácora vacía.
+
+        Los JSON nuevos se escriben primero como <archivo>.compact y recién
+        después se crea la marca <bitácora>.compact. Si el proceso cae antes de
+        la marca, los .compact se descartan y la bitácora sigue valiendo; si cae
+        después, el próximo arranque termina la compactación en vez de
+        reproducir la bitácora encima de los JSON ya compactados.
+        """
+        with self._flush_lock, self._lock:
+            # Las líneas pendientes ya están en memoria y entran en la foto
+            self._take_pending()
+            save_json(self.users_file + '.compact', self.users_db, fsync=True, codec=self.codec)
+            save_json(self.sessions_file + '.compact', self.sessions_db, fsync=True, codec=self.codec)
+            write_file(self._marker, '', fsync=True)
+            self._journal.close()
+            self._finish_compaction(self.users_file, self.sessions_file)
+            self._journal = open(self.journal_file, 'a', encoding='utf-8')
+            self._unsynced.discard(self.journal_file)
+
+    def _finish_compaction(self, users_file, sessions_file):
+        """Completa una compactación con marca o descarta una que no llegó a tenerla."""
+        pending = [name for name in (users_file, sessions_file) if os.path.exists(name + '.compact')]
+        if not os.path.exists(self._marker):
+            for name in pending:
+                os.unlink(name + '.compact')
+            return
+        for name in pending:
+            os.replace(name + '.compact', name)
+            fsync_dir(os.path.dirname(os.path.abspath(name)))
+        write_file(self.journal_file, '', fsync=True)
+        os.unlink(self._marker)
+        fsync_dir(os.path.dirname(os.path.abspath(self._marker)))
+
+    def close(self):
+        super().close()
+        self._journal.close()
+
+
+class IndexedFile:
+    """Objeto raíz de un archivo de datos que se lee por partes.
+
+    En memoria solo queda un índice clave → (inicio, fin) en bytes sobre el
+    archivo mapeado con mmap; cada valor se decodifica la primera vez que se
+    pide y desde entonces vive en `loaded`. El índice se guarda junto al
+    archivo (<archivo>.idx) con el tamaño y la fecha que describe; si no
+    coinciden (el archivo lo escribió otro backend o a mano) se recorre el
+    archivo una vez para rehacerlo. Se lee en el formato que tenga y se
+    escribe con `codec`.
+    """
+
+    def __init__(self, filename, codec):
+        self.filename = filename
+        self.index_file = filename + '.idx'
+        self.codec = codec
+        self.reader = codec
+        self.offsets = {}
+        self.loaded = {}
+        self._map = None
+        self._lock = threading.RLock()
+        if os.path.exists(filename) and os.path.getsize(filename) > 0:
+            with open(filename, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                stat = os.fstat(f.fileno())
+            self.reader = detect(self._map[:64])
+            offsets = self._saved_offsets(stat)
+            if offsets is None:
+                offsets = {key: (start, end) for key, start, end in self.reader.spans(self._map[:])}
+                self._save_index(offsets, stat)
+            self.offsets = offsets
+
+    def _saved_offsets(self, stat):
+        try:
+            saved = load_json(self.index_file)
+        except ValueError:
+            return None
+        if saved.get('size') != stat.st_size or saved.get('mtime_ns') != stat.st_mtime_ns:
+            return None
+        return {key: tuple(span) for key, span in saved['offsets'].items()}
+
+    def _save_index(self, offsets, stat):
+        index = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'offsets': offsets}
+        try:
+            write_file(self.index_file, json.dumps(index, ensure_ascii=False, separators=(',', ':')))
+        except OSError:
+            # Sin índice el próximo arranque vuelve a recorrer el archivo
+            logger.warning('No se pudo guardar %s', self.index_file)
+
+    def __contains__(self, key):
+        return key in self.loaded or key in self.offsets
+
+    def __len__(self):
+        return len(self.offsets) + sum(1 for key in self.loaded if key not in self.offsets)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self.loaded:
+                span = self.offsets.get(key)
+                if span is None:
+                    return default
+                self.loaded[key] = self.reader.decode(self._map[span[0]:span[1]])
+            return self.loaded[key]
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        return self.get(key)
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self.loaded[key] = value
+
+    def setdefault(self, key, default=None):
+        with self._lock:
+            if key not in self:
+                self.loaded[key] = default
+            return self.get(key)
+
+    def dump(self):
+        """(bytes del archivo completo, índice nuevo). Los valores cargados se
+        codifican con `codec`; los demás se copian tal cual del archivo actual
+        si está en la misma familia de formato (JSON o msgpack)."""
+        with self._lock:
+            keys = list(self.offsets) + [key for key in self.loaded if key not in self.offsets]
+            same_family = self.reader.family == self.codec.family
+
+            def values():
+                for key in keys:
+                    if key in self.loaded:
+                        yield key, self.codec.encode_value(self.loaded[key])
+                    else:
+                        start, end = self.offsets[key]
+                        raw = self._map[start:end]
+                        if not same_family:
+                            raw = self.codec.encode_value(self.reader.decode(raw))
+                        yield key, raw
+
+            return self.codec.frame(values(), len(keys))
+
+    def replace(self, data, offsets, fsync=False):
+        """Escribe el archivo generado por dump() y pasa a leer de él."""
+        write_file(self.filename, data, fsync)
+        with open(self.filename, 'rb') as f:
+            new_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            stat = os.fstat(f.fileno())
+        with self._lock:
+            old, self._map, self.offsets = self._map, new_map, offsets
+            self.reader = self.codec
+        if old is not None:
+            old.close()
+        self._save_index(offsets, stat)
+
+
+class LazyJsonStore(JsonStore):
+    """Los mismos users.json y sessions.json que JsonStore, sin cargarlos.
+
+    Al iniciar solo se lee el índice de cada archivo (IndexedFile), así que el
+    arranque y la memoria de cada worker dependen de los usuarios que se usan,
+    no del tamaño del historial. Cada flush reescribe el archivo copiando los
+    usuarios no cargados byte a byte.
+    """
+
+    def _open(self, filename):
+        return IndexedFile(filename, self.codec)
+
+    def _take_pending(self):
+        files = {self.users_file: self.users_db, self.sessions_file: self.sessions_db}
+        pending = [(files[filename], *files[filename].dump()) for filename in self._dirty]
+        self._dirty.clear()
+        return pending
+
+    def _write_pending(self, pending, fsync):
+        for data, text, offsets in pending:
+            data.replace(text, offsets, fsync)
+
+    def _pending_files(self, pending):
+        return [data.filename for data, _, _ in pending]
+
+
+class ShardStore(BaseStore):
+    """Un archivo por usuario: cada escritura toca solo los datos de quien escribe.
+
+    data/index.json guarda la lista de usuarios; data/users/<id>.json y
+    data/sessions/<id>.json guardan el registro y los mensajes de cada uno. Los
+    shards se cargan en memoria la primera vez que se usan.
+    """
+
+    def __init__(self, data_dir='data', fsync='never', codec='json'):
+        super().__init__(fsync, codec)
+        self.data_dir = data_dir
+        self.index_file = os.path.join(data_dir, 'index.json')
+        os.makedirs(os.path.join(data_dir, 'users'), exist_ok=True)
+        os.makedirs(os.path.join(data_dir, 'sessions'), exist_ok=True)
+        self.usernames = set(load_json(self.index_file) or [])
+        self.users_db = {}
+        self.sessions_db = {}
+        self._dirty = set()
+
+    def _shard(self, kind, username):
+        # El nombre de usuario puede tener espacios o acentos: se usa su hash
+        name = hashlib.sha1(username.encode('utf-8')).hexdigest()
+        return os.path.join(self.data_dir, kind, name + '.json')
+
+    def get_user(self, username):
+        if username not in self.usernames:
+            return None
+        with self.user_lock(username):
+            if username not in self.users_db:
+                user = load_json(self._shard('users', username))
+                with self._lock:
+                    self.users_db[username] = user
+            return self.users_db[username]
+
+    def get_sessions(self, username):
+        return self.get_user(username).get('sessions', [])
+
+    def get_sessions_page(self, username, since=None, until=None, before=None, limit=20):
+        return page_sessions(self.get_sessions(username), since, until, before, limit)
+
+    def get_chats(self, username, limit=20):
+        if username not in self.usernames:
+            return []
+        with self.user_lock(username):
+            return list(self._chats(username)[-limit:])
+
+    def history_version(self, username):
+        return history_version(self.get_user(username))
+
+    def _chats(self, username):
+        # Se llama con user_lock(username) tomado
+        if username not in self.sessions_db:
+            chats = load_json(self._shard('sessions', username)) or []
+            with self._lock:
+                self.sessions_db[username] = chats
+        return self.sessions_db[username]
+
+    def create_user(self, username, record):
+        self._check(record)
+        with self.user_lock(username):
+            if username in self.usernames:
+                return False
+            with self._lock:
+                self.users_db[username] = record
+                self.usernames.add(username)
+                self._dirty.add(('users', username))
+                self._dirty.add(('index', None))
+        self._persist()
+        return True
+
+    def add_chat(self, username, entry):
+        self.add_chats(username, [entry])
+
+    def add_chats(self, username, entries):
+        self._check(*entries)
+        with self.user_lock(username):
+            chats = self._chats(username)
+            with self._lock:
+                chats.extend(entries)
+                self._dirty.add(('sessions', username))
+        self._persist()
+
+    def add_session(self, username, entry):
+        self._check(entry)
+        with self.user_lock(username):
+            user = self.get_user(username)
+            with self._lock:
+                record_session(user, entry)
+                self._dirty.add(('users', username))
+        self._persist()
+
+    def get_stats(self, username):
+        with self.user_lock(username):
+            return self._user_stats(self.get_user(username))
+
+    def sizes(self):
+        # Los shards no cargados no están en memoria: se cuentan los archivos
+        # (los mensajes de un usuario nuevo cuentan después del primer flush)
+        folder = os.path.join(self.data_dir, 'sessions')
+        chats = sum(1 for name in os.listdir(folder) if name.endswith('.json') and not name.startswith('.'))
+        return len(self.usernames), chats
+
+    def _take_pending(self):
+        pending = []
+        for kind, username in self._dirty:
+            if kind == 'index':
+                pending.append((self.index_file, self.codec.encode(sorted(self.usernames))))
+            else:
+                data = self.users_db if kind == 'users' else self.sessions_db
+                pending.append((self._shard(kind, username), self.codec.encode(data[username])))
+        self._dirty.clear()
+        return pending
+
+    def import_json(self, users_file='users.json', sessions_file='sessions.json'):
+        """Reparte los JSON monolíticos en un shard por usuario."""
+        users = chats = 0
+        for username, record in iter_json_items(users_file):
+            save_json(self._shard('users', username), record, codec=self.codec)
+            self.usernames.add(username)
+            users += 1
+        for username, entries in iter_json_items(sessions_file):
+            save_json(self._shard('sessions', username), entries, codec=self.codec)
+            chats += len(entries)
+        save_json(self.index_file, sorted(self.usernames), codec=self.codec)
+        return users, chats
+
+
+class SqliteStore:
+    """Base de datos SQLite (modo WAL) con tablas indexadas por usuario.
+
+    Nada se carga en memoria al iniciar: cada ruta hace su propia consulta.
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS users (
+            username TEXT PRIMARY KEY,
+            password TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS chat_messages (
+            id INTEGER PRIMARY KEY,
+            username TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            message TEXT NOT NULL,
+            responses TEXT NOT NULL,
+            kb_version TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_chat_user_ts ON chat_messages (username, timestamp);
+        CREATE TABLE IF NOT EXISTS ham_sessions (
+            id INTEGER PRIMARY KEY,
+            username TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            score INTEGER,
+            responses TEXT,
+            general_level INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS idx_ham_user_ts ON ham_sessions (username, timestamp);
+        CREATE TABLE IF NOT EXISTS ham_stats (
+            username TEXT PRIMARY KEY,
+            stats TEXT NOT NULL
+        );
+    '''
+
+    # Equivalencia entre la política de fsync y PRAGMA synchronous
+    SYNCHRONOUS = {'always': 'FULL', 'batched': 'NORMAL', 'never': 'OFF'}
+
+    def __init__(self, db_file='anxiety.db', fsync='batched'):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Política de fsync desconocida: {fsync}")
+        self.db_file = db_file
+        self.synchronous = self.SYNCHRONOUS[fsync]
+        self._local = threading.local()
+        # Conexión propia que se cierra enseguida: con gunicorn --preload esto
+        # corre en el proceso maestro y no debe quedar nada abierto al hacer fork
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executescript(self.SCHEMA)
+                # Bases creadas antes de guardar la versión de la base de conocimiento
+                columns = [row[1] for row in conn.execute('PRAGMA table_info(chat_messages)')]
+                if 'kb_version' not in columns:
+                    conn.execute('ALTER TABLE chat_messages ADD COLUMN kb_version TEXT')
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_file)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA synchronous={self.synchronous}')
+        return conn
+
+    def _conn(self):
+        # sqlite3 no permite compartir conexiones entre hilos ni entre procesos
+        # (fork): una por hilo y por pid. La heredada del padre no se usa ni se
+        # cierra aquí
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._connect()
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def start_write_behind(self, interval=0.2, max_changes=100):
+        raise ValueError('El backend sqlite no usa escritura diferida; ajusta ANXIETY_FSYNC')
+
+    def get_user(self, username):
+        row = self._conn().execute(
+            'SELECT password, created_at FROM users WHERE username = ?', (username,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {'password': row[0], 'created_at': row[1]}
+
+    def get_sessions(self, username):
+        rows = self._conn().execute(
+            'SELECT timestamp, score, responses, general_level FROM ham_sessions '
+            'WHERE username = ? ORDER BY timestamp, id', (username,)
+        ).fetchall()
+        return [self._session(*row) for row in rows]
+
+    def get_sessions_page(self, username, since=None, until=None, before=None, limit=20):
+        """Igual que page_sessions; el cursor es el id de la fila."""
+        where, params = ['username = ?'], [username]
+        if since:
+            where.append('timestamp >= ?')
+            params.append(since)
+        if until:
+            where.append('timestamp < ?')
+            params.append(until)
+        conn = self._conn()
+        total = conn.execute(
+            f'SELECT COUNT(*) FROM ham_sessions WHERE {" AND ".join(where)}', params
+        ).fetchone()[0]
+        if before is not None:
+            where.append('id < ?')
+            params.append(before)
+        rows = conn.execute(
+            'SELECT id, timestamp, score, responses, general_level FROM ham_sessions '
+            f'WHERE {" AND ".join(where)} ORDER BY id DESC LIMIT ?', params + [limit + 1]
+        ).fetchall()
+        next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+        return [self._session(*row[1:]) for row in rows[:limit]], next_cursor, total
+
+    def get_chats(self, username, limit=20):
+        rows = self._conn().execute(
+            'SELECT timestamp, message, responses, kb_version FROM chat_messages '
+            'WHERE username = ? ORDER BY id DESC LIMIT ?', (username, limit)
+        ).fetchall()
+        chats = []
+        for timestamp, message, responses, kb_version in reversed(rows):
+            entry = {'timestamp': timestamp, 'message': message, 'responses': json.loads(responses)}
+            if kb_version is not None:
+                entry['kb_version'] = kb_version
+            chats.append(entry)
+        return chats
+
+    @staticmethod
+    def _session(timestamp, score, responses, general_level):
+        return {
+            'timestamp': timestamp,
+            'score': score,
+            'responses': json.loads(responses),
+            'general_level': general_level
+        }
+
+    def history_version(self, username):
+        count, last = self._conn().execute(
+            'SELECT COUNT(*), MAX(timestamp) FROM ham_sessions WHERE username = ?', (username,)
+        ).fetchone()
+        if last is None:
+            last = self.get_user(username)['created_at']
+        return count, last
+
+    def create_user(self, username, record):
+        try:
+            with self._conn() as conn:
+                conn.execute(
+                    'INSERT INTO users (username, password, created_at) VALUES (?, ?, ?)',
+                    (username, record['password'], record['created_at'])
+                )
+                self._insert_sessions(conn, username, record.get('sessions', []))
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def add_chat(self, username, entry):
+        self.add_chats(username, [entry])
+
+    def add_chats(self, username, entries):
+        with self._conn() as conn:
+            self._insert_chats(conn, username, entries)
+
+    def add_session(self, username, entry):
+        with self._conn() as conn:
+            # IMMEDIATE: otro proceso no puede leer los agregados viejos en medio
+            conn.execute('BEGIN IMMEDIATE')
+            stats = self._stats(conn, username)
+            self._insert_sessions(conn, username, [entry])
+            self._save_stats(conn, username, update_stats(stats, entry))
+
+    def get_stats(self, username):
+        return self._stats(self._conn(), username)
+
+    def _stats(self, conn, username):
+        row = conn.execute('SELECT stats FROM ham_stats WHERE username = ?', (username,)).fetchone()
+        if row is not None:
+            stats = json.loads(row[0])
+            if valid_stats(stats):
+                return stats
+        return compute_stats(self.get_sessions(username))
+
+    def _save_stats(self, conn, username, stats):
+        conn.execute('INSERT OR REPLACE INTO ham_stats (username, stats) VALUES (?, ?)',
+                     (username, json.dumps(stats, ensure_ascii=False)))
+
+    def _insert_chats(self, conn, username, entries):
+        conn.executemany(
+            'INSERT INTO chat_messages (username, timestamp, message, responses, kb_version) '
+            'VALUES (?, ?, ?, ?, ?)',
+            [(username, e['timestamp'], e['message'], json.dumps(e['responses'], ensure_ascii=False),
+              e.get('kb_version')) for e in entries]
+        )
+
+    def _insert_sessions(self, conn, username, entries):
+        conn.executemany(
+            'INSERT INTO ham_sessions (username, timestamp, score, responses, general_level) '
+            'VALUES (?, ?, ?, ?, ?)',
+            [(username, e['timestamp'], e.get('score'),
+              json.dumps(e.get('responses'), ensure_ascii=False), e.get('general_level'))
+             for e in entries]
+        )
+
+    def sizes(self):
+        conn = self._conn()
+        users = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+        chats = conn.execute('SELECT COUNT(DISTINCT username) FROM chat_messages').fetchone()[0]
+        return users, chats
+
+    def import_json(self, users_file='users.json', sessions_file='sessions.json'):
+        """Copia los JSON existentes a la base, un usuario por transacción.
+
+        Se puede repetir: los usuarios que ya están no se tocan y los mensajes
+        de quien ya tiene mensajes en la base no se vuelven a copiar.
+        """
+        users = chats = 0
+        for username, record in iter_json_items(users_file):
+            if self.create_user(username, record):
+                users += 1
+        for username, entries in iter_json_items(sessions_file):
+            with self._conn() as conn:
+                if conn.execute('SELECT 1 FROM chat_messages WHERE username = ? LIMIT 1',
+                                (username,)).fetchone():
+                    continue
+                self._insert_chats(conn, username, entries)
+            chats += len(entries)
+        return users, chats
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local.conn = None
+
+
+BACKENDS = {
+    'json': JsonStore,
+    'journal': JournalStore,
+    'lazy': LazyJsonStore,
+    'sqlite': SqliteStore,
+    'shards': ShardStore,
+}
+
+def open_store(backend='json', fsync=None, codec=None):
+    """Crea el store; fsync=None y codec=None dejan los valores por defecto de
+    cada backend. SQLite no usa codec: guarda sus propias tablas."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de almacenamiento desconocido: {backend}")
+    options = {}
+    if fsync is not None:
+        options['fsync'] = fsync
+    if codec is not None:
+        if backend == 'sqlite':
+            raise ValueError('El backend sqlite no usa ANXIETY_CODEC')
+        options['codec'] = codec
+    return BACKENDS[backend](**options)
@@ -0,0 +1,61 @@
+# ============================================
+# ANXIETY CHAT - EVENTOS DEL SERVIDOR (SSE)
+# ============================================
+
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Cada cuántos segundos se envía un comentario para mantener viva la conexión
+HEARTBEAT = 15
+# Eventos en espera por conexión antes de descartar (cliente demasiado lento)
+QUEUE_SIZE = 100
+
+
+def format_event(event, data):
+    """Texto de un evento SSE: 'event: <tipo>' y una línea 'data:' con JSON."""
+    return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+class ChatStreams:
+    """Conexiones /api/stream abiertas en este proceso, por usuario.
+
+    Cada conexión se registra con una función que recibe (evento, datos) y los
+    encola a su manera: queue.Queue en la app WSGI, asyncio.Queue (vía
+    call_soon_threadsafe) en el servidor asyncio. Con varios workers, un
+    mensaje solo puede salir por el stream si llegó al mismo proceso.
+    """
+
+    def __init__(self):
+        self._subscribers = {}  # usuario → set de funciones
+        self._lock = threading.Lock()
+
+    def subscribe(self, username, send):
+        with self._lock:
+            self._subscribers.setdefault(username, set()).add(send)
+
+    def unsubscribe(self, username, send):
+        with self._lock:
+            subscribers = self._subscribers.get(username)
+            if subscribers is not None:
+                subscribers.discard(send)
+                if not subscribers:
+                    del self._subscribers[username]
+
+    def has(self, username):
+        return username in self._subscribers
+
+    def publish(self, username, event, data):
+        """Envía el evento a todas las conexiones del usuario; devuelve cuántas lo recibieron."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(username, ()))
+        delivered = 0
+        for send in subscribers:
+            try:
+                send((event, data))
+                delivered += 1
+            except Exception:
+                logger.warning('Evento %s descartado para %s (cola llena)', event, username)
+        return delivered